@@ -1,21 +1,50 @@
 #!/usr/bin/env python3
-import sys, os; sys.path.insert(0, os.path.dirname(__file__))
-import os, re, time, argparse
+import os, re, asyncio, argparse, hashlib
+import sys; sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # repo root: insider_scanner
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date
 from urllib.parse import urljoin
-import requests
+import aiohttp
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import zstandard
 from tqdm import tqdm
-from insider_scanner import parse_form4_xml  # reuses your working parser
+from insider_scanner import parse_form4_xml, RateLimiter  # reuses your working parser
 
 SEC_EMAIL = os.getenv("SEC_EMAIL", "your.name@example.com")
 HEADERS = {
     "User-Agent": f"InsiderBacktest/1.0 ({SEC_EMAIL})",
-    "Accept-Encoding": "gzip, deflate",
+    # no Accept-Encoding: the client offers br/zstd on top of gzip when their decoders are installed
     "Host": "www.sec.gov",
     "Connection": "keep-alive",
 }
-BASE = "https://www.sec.gov/Archives/edgar/"
+ARCHIVES = "https://www.sec.gov/Archives/"
+BASE = ARCHIVES + "edgar/"  # master.idx filenames are relative to ARCHIVES ("edgar/data/...")
+
+# Row tuples as parse_form4_xml returns them (FORM4_COLS), plus the filing fields
+ROW_SCHEMA = pa.schema([
+    ("symbol", pa.string()), ("owner", pa.string()),
+    ("shares", pa.float64()), ("price", pa.float64()), ("amount_usd", pa.float64()),
+    ("tenb5", pa.bool_()), ("txn_date", pa.string()),
+    ("filing_url", pa.string()), ("xml_url", pa.string()), ("filing_dt", pa.string()),
+])
+# Column layout of the trades parquet: money is stored as exact int64 cents
+TRADE_SCHEMA = pa.schema([
+    ("symbol", pa.string()), ("owner", pa.string()),
+    ("shares", pa.float64()), ("price_cents", pa.int64()), ("amount_usd_cents", pa.int64()),
+    ("tenb5", pa.bool_()), ("txn_date", pa.string()),
+    ("filing_url", pa.string()), ("xml_url", pa.string()), ("filing_dt", pa.string()),
+])
+
+def to_cents(dollars) -> pa.Array:
+    return pc.cast(pc.round(pc.multiply(dollars, 100.0)), pa.int64())
+
+_ZC = zstandard.ZstdCompressor(level=9)
+_ZD = zstandard.ZstdDecompressor()
+_OWNERSHIP_HREF_RE = re.compile(rb'href="([^"]*ownership\.xml)"', re.I)
 
 def quarter(dt: date) -> int: return (dt.month - 1)//3 + 1
 def iter_quarters(start: date, end: date):
@@ -26,14 +55,38 @@ def iter_quarters(start: date, end: date):
         q += 1
         if q == 5: q = 1; y += 1
 
-def fetch(url: str, text=False):
-    r = requests.get(url, headers=HEADERS, timeout=30)
-    if r.status_code != 200: raise RuntimeError(f"HTTP {r.status_code} {url}")
-    return r.text if text else r.content
+async def fetch(session, limiter, url: str, text=False):
+    await limiter.wait()
+    async with session.get(url) as r:
+        if r.status != 200: raise RuntimeError(f"HTTP {r.status} {url}")
+        return await r.text(errors="replace") if text else await r.read()
+
+def write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f: f.write(data)
+    os.replace(tmp, path)
+
+async def fetch_archived(session, limiter, url: str, cache_dir=None) -> bytes:
+    """fetch() for Archives documents, which never change once filed: kept zstd-compressed
+    under cache_dir/sub so re-runs read them from disk instead of SEC."""
+    if not cache_dir:
+        return await fetch(session, limiter, url)
+    path = os.path.join(cache_dir, "sub", hashlib.sha1(url.encode()).hexdigest() + ".zst")
+    if os.path.exists(path):
+        with open(path, "rb") as f: return _ZD.decompress(f.read())
+    body = await fetch(session, limiter, url)
+    write_atomic(path, _ZC.compress(body))
+    return body
 
-def list_form4_in_quarter(y: int, q: int) -> pd.DataFrame:
+async def list_form4_in_quarter(session, limiter, y: int, q: int, cache_dir=None) -> pd.DataFrame:
+    # a closed quarter's index is final, so its Form 4 list is cached as parquet
+    closed = date(y + q//4, q%4*3 + 1, 1) <= date.today()
+    cached = os.path.join(cache_dir, "idx", f"{y}Q{q}.parquet") if cache_dir else None
+    if cached and closed and os.path.exists(cached):
+        return pd.read_parquet(cached)
     idx_url = f"{BASE}full-index/{y}/QTR{q}/master.idx"
-    raw = fetch(idx_url, text=True)
+    raw = await fetch(session, limiter, idx_url, text=True)
     lines = raw.splitlines()
     start = 0
     for i, ln in enumerate(lines):
@@ -45,74 +98,124 @@ def list_form4_in_quarter(y: int, q: int) -> pd.DataFrame:
         cik, company, form, filed, fname = parts
         if form == "4":
             entries.append((int(cik), company, form, filed, fname))
-    return pd.DataFrame(entries, columns=["cik","company","form","filed","filename"])
+    df = pd.DataFrame(entries, columns=["cik","company","form","filed","filename"])
+    if cached and closed:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        df.to_parquet(cached, index=False)
+    return df
 
-def extract_xml_blobs(sub_txt: str):
-    for m in re.finditer(r"(<ownershipDocument[\\s\\S]*?</ownershipDocument>)", sub_txt, re.I):
-        yield m.group(1).encode("utf-8")
+_DOC_OPEN, _DOC_CLOSE = b"<ownershipDocument", b"</ownershipDocument>"
 
-def parse_submission_to_rows(submission_url: str):
-    txt = fetch(urljoin(BASE, submission_url), text=True)
+def extract_xml_blobs(sub: bytes):
+    """Yield each <ownershipDocument>...</ownershipDocument> span of a raw submission."""
+    i = sub.find(_DOC_OPEN)
+    while i != -1:
+        j = sub.find(_DOC_CLOSE, i)
+        if j == -1: return
+        j += len(_DOC_CLOSE)
+        yield sub[i:j]
+        i = sub.find(_DOC_OPEN, j)
+
+def parse_submission_bytes(raw: bytes):
+    """Parse every inline ownership document of a submission; None if it has none.
+    Runs in the parse pool, so only the raw bytes and the row dicts cross processes."""
     rows, found = [], False
-    for xml_bytes in extract_xml_blobs(txt):
+    for xml_bytes in extract_xml_blobs(raw):
         found = True
         try:
             rows.extend(parse_form4_xml(xml_bytes))
         except Exception:
             continue
-    if not found:
-        idx_url = urljoin(BASE, submission_url.replace(".txt","-index.htm"))
+    return rows if found else None
+
+async def parse_submission_to_rows(session, limiter, submission_url: str, cache_dir=None, pool=None):
+    loop = asyncio.get_running_loop()
+    raw = await fetch_archived(session, limiter, urljoin(ARCHIVES, submission_url), cache_dir)
+    rows = await loop.run_in_executor(pool, parse_submission_bytes, raw)
+    if rows is None:
+        rows = []
+        idx_url = urljoin(ARCHIVES, submission_url.replace(".txt","-index.htm"))
         try:
-            html = fetch(idx_url, text=True)
-            m = re.search(r'href="([^"]*ownership\\.xml)"', html, flags=re.I)
+            m = _OWNERSHIP_HREF_RE.search(await fetch_archived(session, limiter, idx_url, cache_dir))
             if m:
-                xml_url = urljoin(idx_url.rsplit("/",1)[0]+"/", m.group(1))
-                xml_bytes = fetch(xml_url, text=False)
-                rows.extend(parse_form4_xml(xml_bytes))
+                xml_url = urljoin(idx_url.rsplit("/",1)[0]+"/", m.group(1).decode("utf-8", errors="replace"))
+                xml_bytes = await fetch_archived(session, limiter, xml_url, cache_dir)
+                rows.extend(await loop.run_in_executor(pool, parse_form4_xml, xml_bytes))
         except Exception:
             pass
-    for r in rows:
-        r["filing_url"] = urljoin(BASE, submission_url.replace(".txt","-index.htm"))
-        r["xml_url"]    = urljoin(BASE, submission_url)
-    return rows
+    tail = (urljoin(ARCHIVES, submission_url.replace(".txt","-index.htm")), urljoin(ARCHIVES, submission_url))
+    return [r + tail for r in rows]
+
+async def backfill(args):
+    """Backfill every quarter in range, appending each one to args.out as it finishes.
+    Returns the number of rows written."""
+    start = datetime.fromisoformat(args.start).date()
+    end   = datetime.fromisoformat(args.end).date()
+
+    limiter = RateLimiter(args.rate)
+    connector = aiohttp.TCPConnector(limit_per_host=args.workers, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=30)
+    # spawned, not forked: workers start on first use, after aiohttp's resolver threads exist
+    pool = ProcessPoolExecutor(max_workers=args.procs, mp_context=multiprocessing.get_context("spawn"))
+    writer, saved = None, 0
+    try:
+        async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout) as session:
+            for y,q in iter_quarters(start, end):
+                dfq = await list_form4_in_quarter(session, limiter, y, q, args.cache_dir)
+                if dfq.empty: continue
+                dfq = dfq[(dfq["filed"] >= args.start) & (dfq["filed"] <= args.end)].head(args.perq_limit)
+                jobs = zip(dfq["filename"].to_numpy(), dfq["filed"].to_numpy())
+                quarter_rows = []
+                bar = tqdm(total=len(dfq), desc=f"{y}Q{q}")
+
+                # `workers` coroutines share one iterator, so at most that many filings are in flight
+                async def worker():
+                    for fname, filed in jobs:
+                        try:
+                            items = await parse_submission_to_rows(session, limiter, fname, args.cache_dir, pool)
+                            filing_dt = (filed + "T00:00:00Z",)
+                            quarter_rows.extend(r + filing_dt for r in items)
+                        except Exception:
+                            pass
+                        bar.update()
+
+                await asyncio.gather(*(worker() for _ in range(args.workers)))
+                bar.close()
+
+                cols = list(zip(*quarter_rows)) or [()] * len(ROW_SCHEMA)
+                tbl = pa.Table.from_arrays([pa.array(c, type=f.type) for c, f in zip(cols, ROW_SCHEMA)],
+                                           schema=ROW_SCHEMA)
+                tbl = tbl.filter(pc.and_(pc.is_valid(tbl["symbol"]),
+                                         pc.invert(pc.is_null(tbl["amount_usd"], nan_is_null=True))))
+                tbl = (tbl.append_column("price_cents", to_cents(tbl["price"]))
+                          .append_column("amount_usd_cents", to_cents(tbl["amount_usd"]))
+                          .select(TRADE_SCHEMA.names))
+                if tbl.num_rows:
+                    if writer is None:
+                        writer = pq.ParquetWriter(args.out, TRADE_SCHEMA, compression="zstd")
+                    writer.write_table(tbl)
+                    saved += tbl.num_rows
+    finally:
+        pool.shutdown(cancel_futures=True)
+        if writer is not None: writer.close()
+    return saved
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--start", default="2024-01-01")
     ap.add_argument("--end",   default=datetime.utcnow().date().isoformat())
     ap.add_argument("--out",   default="trades.parquet")
-    ap.add_argument("--sleep", type=float, default=0.2)
+    ap.add_argument("--rate",  type=float, default=10.0, help="max SEC requests per second")
+    ap.add_argument("--workers", type=int, default=10, help="filings fetched concurrently")
+    ap.add_argument("--procs", type=int, default=os.cpu_count(), help="processes parsing filings")
     ap.add_argument("--perq_limit", type=int, default=200000)
+    ap.add_argument("--cache_dir", default=".sec_cache", help="local cache of index parses and filings ('' to disable)")
     args = ap.parse_args()
 
-    start = datetime.fromisoformat(args.start).date()
-    end   = datetime.fromisoformat(args.end).date()
-
-    all_rows = []
-    for y,q in iter_quarters(start, end):
-        dfq = list_form4_in_quarter(y,q)
-        if dfq.empty: continue
-        dfq = dfq[(dfq["filed"] >= args.start) & (dfq["filed"] <= args.end)].head(args.perq_limit)
-        for _, row in tqdm(dfq.iterrows(), total=len(dfq), desc=f"{y}Q{q}"):
-            fname = row["filename"]
-            try:
-                items = parse_submission_to_rows(fname)
-                for it in items:
-                    it["filing_dt"] = row["filed"] + "T00:00:00Z"
-                all_rows.extend(items)
-            except Exception:
-                pass
-            time.sleep(args.sleep)
-
-    if not all_rows:
+    saved = asyncio.run(backfill(args))
+    if not saved:
         print("No rows parsed."); return
-    df = pd.DataFrame(all_rows)
-    df["amount_usd"] = pd.to_numeric(df["amount_usd"], errors="coerce")
-    df["price"]      = pd.to_numeric(df["price"], errors="coerce")
-    df["shares"]     = pd.to_numeric(df["shares"], errors="coerce")
-    df = df.dropna(subset=["symbol","amount_usd"])
-    df.to_parquet(args.out, index=False)
-    print(f"Saved {len(df):,} rows to {args.out}")
+    print(f"Saved {saved:,} rows to {args.out}")
 
 if __name__ == "__main__":
     main()
@@ -6,7 +6,7 @@ cd "$(dirname "$0")"
 if [ ! -d .venv ]; then python3 -m venv .venv; fi
 source .venv/bin/activate
 python3 -m pip install --upgrade pip
-python3 -m pip install pandas pyarrow requests beautifulsoup4 lxml python-dateutil tqdm yfinance
+python3 -m pip install pandas pyarrow requests lxml python-dateutil tqdm yfinance aiohttp zstandard
 
 # backfill in chunks (idempotent)
 RANGES=(
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
-import argparse, pandas as pd
+import argparse, pandas as pd, numpy as np
+import pyarrow.parquet as pq
 from pandas import to_datetime
 
 def first_cross_events(df, window_days=14, min_owners=3, min_usd=300000, exclude_10b5=True):
@@ -8,24 +9,58 @@ def first_cross_events(df, window_days=14, min_owners=3, min_usd=300000, exclude
     df["_t"] = fd
     if exclude_10b5 and "tenb5" in df.columns:
         df = df[~df["tenb5"].astype(bool)]
-    df = df.dropna(subset=["symbol","_t","amount_usd","owner"])
-    df["amount_usd"] = pd.to_numeric(df["amount_usd"], errors="coerce")
+    # window sums run on exact int64 cents; older trade files only carry float amount_usd
+    amt_col = "amount_usd_cents" if "amount_usd_cents" in df.columns else "amount_usd"
+    df = df.dropna(subset=["symbol","_t",amt_col,"owner"])
+    cents = pd.to_numeric(df[amt_col], errors="coerce")
+    if amt_col == "amount_usd":
+        cents = (cents * 100).round()
+    df["_cents"] = cents.fillna(0).astype("int64")
     df = df.sort_values(["symbol","_t"])
+    win = pd.Timedelta(days=window_days).value
+    min_cents = round(min_usd * 100)
+    # Integer codes once up front; the sweep then touches no strings. Sorted by symbol,
+    # each symbol is one contiguous run of rows.
+    sym_codes, sym_uniq = pd.factorize(df["symbol"], sort=False)
+    own_codes, own_uniq = pd.factorize(df["owner"], sort=False)
+    ts_all  = df["_t"].reset_index(drop=True)
+    t_all   = ts_all.dt.tz_localize(None).to_numpy("datetime64[ns]").view("int64").tolist()
+    amt_all = df["_cents"].to_numpy().tolist()
+    own_all = own_codes.tolist()
+    bounds  = [0, *(np.flatnonzero(np.diff(sym_codes)) + 1).tolist(), len(sym_codes)] if len(df) else [0]
+    counts  = [0] * len(own_uniq)  # per-owner trades in the window; all zero between runs
     signals = []
-    for sym, g in df.groupby("symbol", sort=False):
-        g = g.reset_index(drop=True)
-        for _, row in g.iterrows():
-            t0 = row["_t"]
-            w  = g[(g["_t"]>=t0 - pd.Timedelta(days=window_days)) & (g["_t"]<=t0)]
-            owners = w["owner"].nunique()
-            tots   = w["amount_usd"].sum()
-            w_prev = g[(g["_t"]>=t0 - pd.Timedelta(days=window_days)) & (g["_t"]<t0)]
-            crossed_prev = (w_prev["owner"].nunique()>=min_owners) and (w_prev["amount_usd"].sum()>=min_usd)
-            crossed_now  = (owners>=min_owners) and (tots>=min_usd)
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        sym = sym_uniq[sym_codes[a]]
+        # Sweep the run once: [lo, i) is the window before t0, [lo, j) includes t0.
+        owners, total, lo, i = 0, 0, a, a
+        while i < b:
+            t0 = t_all[i]
+            j = i
+            while j < b and t_all[j] == t0: j += 1
+            while t_all[lo] < t0 - win:
+                o = own_all[lo]
+                counts[o] -= 1
+                if not counts[o]: owners -= 1
+                total -= amt_all[lo]; lo += 1
+            crossed_prev = (owners>=min_owners) and (total>=min_cents)
+            for k in range(i, j):
+                o = own_all[k]
+                if not counts[o]: owners += 1
+                counts[o] += 1
+                total += amt_all[k]
+            crossed_now  = (owners>=min_owners) and (total>=min_cents)
             if crossed_now and not crossed_prev:
-                signals.append({"symbol": sym, "t0": t0, "owners_count": int(owners), "total_usd": float(tots)})
+                # one record per trade at t0, as the per-row scan produced
+                sig = {"symbol": sym, "t0": ts_all[i], "owners_count": owners, "total_usd": total / 100}
+                signals.extend(dict(sig) for _ in range(i, j))
+            i = j
+        for k in range(lo, b): counts[own_all[k]] -= 1
     return pd.DataFrame(signals)
 
+# the only trade columns first_cross_events reads (old files carry amount_usd, new ones cents)
+SIGNAL_COLS = ["symbol","owner","filing_dt","tenb5","amount_usd_cents","amount_usd"]
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--trades", default="trades.parquet")
@@ -36,7 +71,9 @@ def main():
     ap.add_argument("--exclude_10b5", type=int, default=1)
     args = ap.parse_args()
 
-    df = pd.read_parquet(args.trades)
+    cols = [c for c in SIGNAL_COLS if c in pq.read_schema(args.trades).names]
+    tbl = pq.read_table(args.trades, columns=cols, memory_map=True)
+    df = tbl.to_pandas(split_blocks=True, self_destruct=True); del tbl
     sig = first_cross_events(
         df,
         window_days=args.window,
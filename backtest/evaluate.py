@@ -4,25 +4,25 @@ from pandas import to_datetime
 import yfinance as yf
 from tqdm import tqdm
 
-def next_trading_open(px: pd.DataFrame, t0):
-    d = t0.tz_convert("UTC").date()
-    days = px.index.date
-    idx = np.searchsorted(days, d, side="right")
-    if idx >= len(px): return None
-    return px.index[idx]
+def price_arrays(px: pd.DataFrame):
+    """(trading days, opens, adj closes, index) of one ticker's history, NaN rows dropped."""
+    px = px.dropna()
+    return (np.array(px.index.date, dtype="datetime64[D]"),
+            px["Open"].to_numpy(dtype=float), px["Adj Close"].to_numpy(dtype=float), px.index)
 
-def returns_at(px: pd.DataFrame, entry_idx, horizons=(5,21,63)):
+def next_trading_open(days: np.ndarray, t0s: pd.Series) -> np.ndarray:
+    """Row position of the first trading day after each signal's UTC date (len(days) if none)."""
+    sig_days = t0s.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[D]")
+    return np.searchsorted(days, sig_days, side="right")
+
+def returns_at(opens: np.ndarray, closes: np.ndarray, entry_pos: np.ndarray, horizons=(5,21,63)):
     out = {}
-    entry_open = px.loc[entry_idx, "Open"]
     for h in horizons:
-        pos = px.index.get_loc(entry_idx)
-        tgt_pos = pos + h
-        if tgt_pos >= len(px):
-            out[f"ret_{h}d"] = np.nan
-            continue
-        exit_idx = px.index[tgt_pos]
-        exit_close = px.loc[exit_idx, "Adj Close"]
-        out[f"ret_{h}d"] = float(exit_close/entry_open - 1.0)
+        tgt_pos = entry_pos + h
+        ok = tgt_pos < len(closes)
+        ret = np.full(len(entry_pos), np.nan)
+        ret[ok] = closes[tgt_pos[ok]] / opens[entry_pos[ok]] - 1.0
+        out[f"ret_{h}d"] = ret
     return out
 
 def main():
@@ -41,19 +41,25 @@ def main():
     tickers = sorted(sig["symbol"].dropna().unique().tolist())
     data = yf.download(tickers, period="12y", interval="1d", auto_adjust=False, group_by="ticker", progress=False)
 
-    rows = []
-    for _, s in tqdm(sig.iterrows(), total=len(sig)):
-        sym, t0 = s["symbol"], s["t0"]
-        px = data if len(tickers)==1 else data[sym]
-        px = px.dropna()
-        if px.empty: continue
-        entry_idx = next_trading_open(px, t0)
-        if entry_idx is None: continue
-        res = {"symbol": sym, "t0": t0, "entry_idx": entry_idx, "owners_count": s["owners_count"], "total_usd": s["total_usd"]}
-        res.update(returns_at(px, entry_idx, tuple(args.horizons)))
-        rows.append(res)
+    # slice the wide MultiIndex frame once per ticker, not once per use
+    px_cache = {sym: price_arrays(data if len(tickers)==1 else data[sym]) for sym in tickers}
+
+    parts = []
+    for sym, s in tqdm(sig.groupby("symbol", sort=False), total=len(tickers)):
+        days, opens, closes, dates = px_cache[sym]
+        if not len(days): continue
+        entry_pos = next_trading_open(days, s["t0"])
+        ok = entry_pos < len(days)
+        if not ok.any(): continue
+        s, entry_pos = s[ok], entry_pos[ok]
+        res = pd.DataFrame({"symbol": sym, "t0": s["t0"], "entry_idx": dates[entry_pos],
+                            "owners_count": s["owners_count"], "total_usd": s["total_usd"]}, index=s.index)
+        for col, ret in returns_at(opens, closes, entry_pos, tuple(args.horizons)).items():
+            res[col] = ret
+        parts.append(res)
 
-    ev = pd.DataFrame(rows)
+    # back in signal order, as the per-row loop emitted them
+    ev = pd.concat(parts).sort_index().reset_index(drop=True) if parts else pd.DataFrame()
     if ev.empty:
         print("No evaluable signals."); return
 
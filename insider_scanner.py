@@ -1,78 +1,137 @@
 #!/usr/bin/env python3
-import os, re, time
+import os, re, csv, time, sqlite3, asyncio, hashlib
 from datetime import datetime, timedelta, timezone
 from urllib.parse import urljoin
 
-import requests
-import pandas as pd
-from bs4 import BeautifulSoup
+import aiohttp
 from dateutil import parser as dtp
+from lxml import etree
 
 SEC_EMAIL = os.getenv("SEC_EMAIL", "your.name@example.com")
 HEADERS = {
     "User-Agent": f"InsiderScanner/1.0 ({SEC_EMAIL})",
-    "Accept-Encoding": "gzip, deflate",
+    # no Accept-Encoding: the client offers br/zstd on top of gzip when their decoders are installed
     "Host": "www.sec.gov",
     "Connection": "keep-alive",
 }
 ATOM_FEED = "https://www.sec.gov/cgi-bin/browse-edgar?action=getcurrent&type=4&count=100&output=atom"
+SEC_RATE     = 10  # requests/second, SEC's fair-access limit
+MAX_FILINGS  = 8   # filings processed concurrently
+
+# Form 4 / atom parsing: lenient like the old BS4 "lxml-xml" path, and namespace-agnostic via {*}
+_XML_PARSER = etree.XMLParser(recover=True, resolve_entities=False)
+_SYMBOL_PATH = ".//{*}issuerTradingSymbol"
+_OWNER_PATH  = ".//{*}reportingOwner"
+_TXN_PATH    = ".//{*}nonDerivativeTransaction"
+_TENB5_RE    = re.compile(rb'10[bB]5-?1')  # same match as re.I, without the case-folding scan
+_XML_DECL_RE = re.compile(r'<\?xml[^>]*\?>')  # a str is already decoded; its encoding= no longer applies
+
+# Filing index scraping: hrefs are pulled from raw bytes, candidate URLs matched as str
+_HREF_RE      = re.compile(rb'href="([^"]+)"', re.I)
+_XMLTXT_RE    = re.compile(r'\.(xml|txt)$', re.I)
+_FORM4_HTM_RE = re.compile(r'(xslf345|form4).*\.htm$', re.I)
+_FORM4_DOC_RE = re.compile(r'(form4|doc4)\.(xml|txt)$')
+_AUX_XML      = ('cal.xml', 'def.xml', 'lab.xml', 'pre.xml', 'xsd')
+
+# parse_form4_xml record layout
+FORM4_COLS = ("symbol","owner","shares","price","amount_usd","tenb5","txn_date")
 
 OUT_TRADES_CSV = "insider_trades.csv"
 OUT_ALERTS_CSV = "alerts.csv"
+HTTP_CACHE_DB  = os.getenv("SEC_HTTP_CACHE", ".sec_http_cache.sqlite")  # "" disables
+SEEN_DB        = os.getenv("TRADES_SEEN_DB", ".insider_seen.sqlite")  # TRADE_KEYs already in OUT_TRADES_CSV
+
+_cache_conn = None
+def _cache():
+    global _cache_conn
+    if _cache_conn is None and HTTP_CACHE_DB:
+        _cache_conn = sqlite3.connect(HTTP_CACHE_DB)
+        _cache_conn.execute("CREATE TABLE IF NOT EXISTS cache("
+                            "url TEXT PRIMARY KEY, etag TEXT, last_mod TEXT, encoding TEXT, body BLOB)")
+    return _cache_conn
+
+class RateLimiter:
+    """Spaces request starts so at most `rate` go out per second (SEC asks for <= 10/s)."""
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self.next_at = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        delay = self.next_at - now
+        self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0: await asyncio.sleep(delay)
 
-def fetch(url, is_html=False, tries=3, sleep_sec=1.0):
+async def fetch(session, limiter, url, is_html=False, tries=3, sleep_sec=1.0):
+    """GET with retries. Responses carrying ETag/Last-Modified are kept in HTTP_CACHE_DB
+       and revalidated with a conditional GET, so unchanged documents come back as 304."""
+    db = _cache()
+    hit = db.execute("SELECT etag, last_mod, encoding, body FROM cache WHERE url=?", (url,)).fetchone() if db else None
+    headers = {}
+    if hit:
+        if hit[0]: headers["If-None-Match"] = hit[0]
+        if hit[1]: headers["If-Modified-Since"] = hit[1]
     for i in range(tries):
-        r = requests.get(url, headers=HEADERS, timeout=30)
-        if r.status_code == 200:
-            return r.text if is_html else r.content
-        time.sleep(sleep_sec * (i + 1))
-    raise RuntimeError(f"HTTP {r.status_code} for {url}")
-
-def get_atom_entries():
-    html = fetch(ATOM_FEED, is_html=True)
-    soup = BeautifulSoup(html, "lxml-xml")
+        await limiter.wait()
+        async with session.get(url, headers=headers) as r:
+            status = r.status
+            if status == 304 and hit:
+                body, encoding = hit[3], hit[2]
+            elif status == 200:
+                body, encoding = await r.read(), r.charset
+                etag, last_mod = r.headers.get("ETag"), r.headers.get("Last-Modified")
+                if db and (etag or last_mod):
+                    db.execute("INSERT OR REPLACE INTO cache VALUES (?,?,?,?,?)",
+                               (url, etag, last_mod, encoding, body))
+                    db.commit()
+            else:
+                await asyncio.sleep(sleep_sec * (i + 1))
+                continue
+        return body.decode(encoding or "utf-8", errors="replace") if is_html else body
+    raise RuntimeError(f"HTTP {status} for {url}")
+
+async def get_atom_entries(session, limiter):
+    root = etree.fromstring(await fetch(session, limiter, ATOM_FEED), _XML_PARSER)
     entries = []
-    for e in soup.find_all("entry"):
-        link = e.find("link")
-        if not link or not link.get("href"):
+    for e in (root.iterfind(".//{*}entry") if root is not None else ()):
+        link = e.find(".//{*}link")
+        if link is None or not link.get("href"):
             continue
-        updated = e.find("updated")
         entries.append({
             "link": link.get("href"),
-            "updated": updated.text if updated else None
+            "updated": e.findtext(".//{*}updated")
         })
     return entries
 
-def find_xml_candidates(index_url):
+async def find_xml_candidates(session, limiter, index_url):
     """Return a preference-ordered list of XML/TXT URLs from the filing index page.
        Falls back to the Form 4 document page if the index has no direct XML/TXT links.
     """
-    html = fetch(index_url, is_html=True)
-    hrefs = re.findall(r'href="([^"]+)"', html, flags=re.I)
-    abs_hrefs = [urljoin(index_url, h) for h in hrefs]
+    async def links(page_url):
+        page = await fetch(session, limiter, page_url)
+        return [urljoin(page_url, h.decode("utf-8", "replace")) for h in _HREF_RE.findall(page)]
+    abs_hrefs = await links(index_url)
 
     # First pass: any XML/TXT links found directly on the index page
-    cands = [u for u in abs_hrefs if re.search(r'\.(xml|txt)$', u, flags=re.I)]
+    cands = [u for u in abs_hrefs if _XMLTXT_RE.search(u)]
 
     # Fallback: follow a likely Form 4 HTML document (xslF345/form4 *.htm) and scrape XML/TXT there
     if not cands:
-        doc_links = [u for u in abs_hrefs if re.search(r'(xslf345|form4).*\.htm$', u, flags=re.I)]
+        doc_links = [u for u in abs_hrefs if _FORM4_HTM_RE.search(u)]
         if doc_links:
             try:
-                doc_html = fetch(doc_links[0], is_html=True)
-                doc_hrefs = re.findall(r'href="([^"]+)"', doc_html, flags=re.I)
-                cands = [urljoin(doc_links[0], u) for u in doc_hrefs if re.search(r'\.(xml|txt)$', u, flags=re.I)]
+                cands = [u for u in await links(doc_links[0]) if _XMLTXT_RE.search(u)]
             except Exception:
                 pass
 
     def score(u: str) -> int:
         ul = u.lower()
         if 'ownership.xml' in ul: return 100
-        if re.search(r'(form4|doc4)\.(xml|txt)$', ul): return 95
+        if _FORM4_DOC_RE.search(ul): return 95
         if 'primary_doc.xml' in ul: return 85
         if 'f345' in ul: return 80
         if ul.endswith('.txt'): return 70
-        if any(x in ul for x in ['cal.xml','def.xml','lab.xml','pre.xml','xsd']): return 5
+        if any(x in ul for x in _AUX_XML): return 5
         return 50
 
     seen = {}
@@ -84,70 +143,63 @@ def find_xml_candidates(index_url):
     return [u for u,_ in sorted(seen.items(), key=lambda kv: kv[1], reverse=True)]
 def parse_form4_xml(xml_text):
     """
-    Return purchase transactions (code 'P') as list of dicts:
-    [{symbol, owner, shares, price, amount_usd, tenb5, txn_date}]
+    Return purchase transactions (code 'P') as a list of tuples in FORM4_COLS order:
+    [(symbol, owner, shares, price, amount_usd, tenb5, txn_date)]
     """
     out = []
-    soup = BeautifulSoup(xml_text, "lxml-xml")
+    if isinstance(xml_text, str):
+        xml_text = _XML_DECL_RE.sub("", xml_text, count=1).encode("utf-8")
+    if not xml_text.strip():
+        return out
+    root = etree.fromstring(xml_text, _XML_PARSER)
+    if root is None:
+        return out
 
-    sym_el = soup.find("issuerTradingSymbol")
-    symbol = sym_el.text.strip() if sym_el else None
+    symbol = root.findtext(_SYMBOL_PATH)
+    symbol = symbol.strip() if symbol is not None else None
 
     # detect 10b5-1 mention anywhere in the XML
-    has_10b5 = bool(re.search(r'10b5-?1', xml_text, flags=re.I))
+    has_10b5 = _TENB5_RE.search(xml_text) is not None
 
     # list of owners (names)
     owners = []
-    for ro in soup.find_all("reportingOwner"):
-        n = ro.find("rptOwnerName")
-        if n and n.text:
-            owners.append(n.text.strip())
+    for ro in root.iterfind(_OWNER_PATH):
+        n = ro.findtext(".//{*}rptOwnerName")
+        if n:
+            owners.append(n.strip())
     if not owners:
         owners = ["(unknown)"]
 
+    def to_float(tx, path):
+        try:
+            return float(tx.findtext(path).replace(",", ""))
+        except:
+            return 0.0
+
     # iterate over non-derivative txns
-    for tx in soup.find_all("nonDerivativeTransaction"):
-        code = tx.find("transactionCode")
-        if not code or code.text.strip().upper() != "P":
+    for tx in root.iterfind(_TXN_PATH):
+        code = tx.findtext(".//{*}transactionCode")
+        if not code or code.strip().upper() != "P":
             continue  # not a purchase
-        shares_node = tx.find("transactionShares")
-        price_node  = tx.find("transactionPricePerShare")
-        date_node   = tx.find("transactionDate")
-
-        def to_float(el):
-            try:
-                v = el.find("value").text
-                return float(v.replace(",", ""))
-            except:
-                return 0.0
-
-        shares = to_float(shares_node) if shares_node else 0.0
-        price  = to_float(price_node)  if price_node  else 0.0
+        shares = to_float(tx, ".//{*}transactionShares/{*}value")
+        price  = to_float(tx, ".//{*}transactionPricePerShare/{*}value")
         amount = shares * price
-        txn_dt = ""
-        try:
-            txn_dt = date_node.find("value").text.strip()
-        except:
-            pass
-
-        for owner in owners:
-            out.append({
-                "symbol": symbol,
-                "owner": owner,
-                "shares": shares,
-                "price": price,
-                "amount_usd": amount,
-                "tenb5": has_10b5,
-                "txn_date": txn_dt
-            })
+        txn_dt = (tx.findtext(".//{*}transactionDate/{*}value") or "").strip()
+
+        out.extend((symbol, owner, shares, price, amount, has_10b5, txn_dt) for owner in owners)
     return out
 
-def load_existing_trades():
-    cols = ["filing_dt","symbol","owner","shares","price","amount_usd","tenb5","txn_date","filing_url","xml_url"]
+TRADE_COLS = ["filing_dt","symbol","owner","shares","price","amount_usd","tenb5","txn_date","filing_url","xml_url"]
+TRADE_KEY  = ["symbol","owner","txn_date","xml_url"]
+
+ALERT_COLS = ["filing_dt","symbol","owner","amount_usd","tenb5","txn_date"]
+
+def load_existing_trades(cols=TRADE_COLS):
+    import pandas as pd  # only the alerting path needs it; the empty run never loads it
     if not os.path.exists(OUT_TRADES_CSV):
         return pd.DataFrame(columns=cols)
     try:
-        df = pd.read_csv(OUT_TRADES_CSV)
+        df = pd.read_csv(OUT_TRADES_CSV, usecols=lambda c: c in cols)
         for c in cols:
             if c not in df.columns:
                 df[c] = pd.NA
@@ -155,41 +207,101 @@ def load_existing_trades():
     except:
         return pd.DataFrame(columns=cols)
 
-def append_trades(rows):
-    df = load_existing_trades()
-    new_df = pd.DataFrame(rows)
-    need_cols = ["filing_dt","symbol","owner","shares","price","amount_usd","tenb5","txn_date","filing_url","xml_url"]
-    for c in need_cols:
-        if c not in new_df.columns:
-            new_df[c] = pd.NA
-    all_df = pd.concat([df, new_df], ignore_index=True)
-    all_df.drop_duplicates(subset=["symbol","owner","txn_date","xml_url"], inplace=True)
-    all_df.to_csv(OUT_TRADES_CSV, index=False)
-    return all_df
+def _cell(v):
+    return "" if v is None or v != v else v  # None/NaN -> empty field, as to_csv writes them
+
+def _trade_key(row, idx):
+    return "\x1f".join(str(_cell(row[i])) for i in idx)
+
+def _trades_header():
+    try:
+        with open(OUT_TRADES_CSV, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), None)
+    except OSError:
+        return None
+
+def _csv_stamp():
+    # size + hash of the tail, not mtime: a fresh checkout/artifact restore touches mtime, not content
+    with open(OUT_TRADES_CSV, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 4096))
+        return f"{size}:{hashlib.sha1(f.read()).hexdigest()}"
+
+def _seen_db():
+    """Keys of the rows in OUT_TRADES_CSV. The CSV's size+tail hash is stored next to them; when the
+       file is missing, or was changed by anything but append_trades (reset, git pull, restored
+       artifact), the keys are cleared and re-read from the CSV."""
+    db = sqlite3.connect(SEEN_DB)
+    db.execute("CREATE TABLE IF NOT EXISTS seen(key TEXT PRIMARY KEY)")
+    db.execute("CREATE TABLE IF NOT EXISTS meta(k TEXT PRIMARY KEY, v TEXT)")
+    stamp = db.execute("SELECT v FROM meta WHERE k='csv'").fetchone()
+    if not os.path.exists(OUT_TRADES_CSV):
+        db.execute("DELETE FROM seen")
+        db.execute("DELETE FROM meta WHERE k='csv'")
+    elif stamp is None or stamp[0] != _csv_stamp():
+        db.execute("DELETE FROM seen")
+        with open(OUT_TRADES_CSV, newline="", encoding="utf-8") as f:
+            r = csv.reader(f)
+            header = next(r, [])
+            idx = [header.index(c) if c in header else None for c in TRADE_KEY]
+            db.executemany("INSERT OR IGNORE INTO seen VALUES (?)",
+                           (("\x1f".join(row[i] if i is not None and i < len(row) else "" for i in idx),)
+                            for row in r))
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('csv', ?)", (_csv_stamp(),))
+    db.commit()
+    return db
+
+def append_trades(rows, columns=FORM4_COLS + ("filing_dt","filing_url","xml_url")):
+    """Append row tuples (laid out as `columns`) not already in OUT_TRADES_CSV (by TRADE_KEY)
+       and return the rows actually added, in TRADE_COLS order. Seen keys live in SEEN_DB (see
+       _seen_db), and the file is only rewritten when its header doesn't match."""
+    pos = [columns.index(c) if c in columns else None for c in TRADE_COLS]
+    rows = [tuple(r[i] if i is not None else None for i in pos) for r in rows]
+    key_idx = [TRADE_COLS.index(c) for c in TRADE_KEY]
+    db = _seen_db()
+    try:
+        rows = [r for r in rows
+                if db.execute("INSERT OR IGNORE INTO seen VALUES (?)", (_trade_key(r, key_idx),)).rowcount == 1]
+
+        header = _trades_header()
+        if header is None or header == TRADE_COLS:
+            with open(OUT_TRADES_CSV, "a", newline="", encoding="utf-8") as f:
+                w = csv.writer(f, lineterminator="\n")
+                if header is None:
+                    w.writerow(TRADE_COLS)
+                w.writerows([_cell(v) for v in r] for r in rows)
+        else:
+            import pandas as pd
+            old = load_existing_trades()
+            pd.concat([old, pd.DataFrame.from_records(rows, columns=TRADE_COLS)], ignore_index=True
+                      ).to_csv(OUT_TRADES_CSV, index=False)
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('csv', ?)", (_csv_stamp(),))
+        db.commit()  # only once the rows are on disk
+    finally:
+        db.close()
+    return rows
 
 def aggregate_alerts(df, days=7, min_owners=3, min_usd=300000, exclude_10b5=True):
+    import pandas as pd
     now = datetime.now(timezone.utc)
     cutoff = now - timedelta(days=days)
 
-    def parse_dt(x):
-        try:
-            d = dtp.parse(str(x))
-            if d.tzinfo is None:
-                d = d.replace(tzinfo=timezone.utc)
-            else:
-                d = d.astimezone(timezone.utc)
-            return d
-        except:
-            return None
+    if exclude_10b5 and "tenb5" in df.columns:
+        df = df[~df["tenb5"].astype(str).str.lower().isin(["true","1"])]
+    # Cheap ISO-prefix pass first so only recent-looking rows get parsed; one day of slack
+    # covers a local date that is behind its UTC instant.
+    floor = (cutoff - timedelta(days=1)).date().isoformat()
+    txn_day = df["txn_date"].astype("string").str.slice(0, 10)
+    filing = df["filing_dt"].astype("string")
+    recent = ((txn_day >= floor) | (filing.str.slice(0, 10) >= floor)).fillna(False)
+    df, txn_day, filing = df[recent].copy(), txn_day[recent], filing[recent]
 
-    df = df.copy()
-    df["_txn_dt"] = df["txn_date"].apply(parse_dt)
-    df["_filing_dt"] = df["filing_dt"].apply(parse_dt)
+    # txn_date is a Form 4 date, sometimes with a trailing offset ("2024-01-05-05:00")
+    df["_txn_dt"] = pd.to_datetime(txn_day, format="%Y-%m-%d", utc=True, errors="coerce")
+    df["_filing_dt"] = pd.to_datetime(filing, format="ISO8601", utc=True, errors="coerce")
     df["_when"] = df[["_txn_dt","_filing_dt"]].max(axis=1)
     df = df[df["_when"].notna()]
     df = df[df["_when"] >= cutoff]
-    if exclude_10b5 and "tenb5" in df.columns:
-        df = df[~df["tenb5"].astype(str).str.lower().isin(["true","1"])]
 
     grouped = (
         df.groupby("symbol", dropna=False)
@@ -202,48 +314,70 @@ def aggregate_alerts(df, days=7, min_owners=3, min_usd=300000, exclude_10b5=True
     )
     alerts = grouped[(grouped["owners_count"] >= min_owners) & (grouped["total_usd"] >= min_usd)]
     return alerts.sort_values(["owners_count","total_usd"], ascending=False)
-def main(days=7, min_owners=3, min_usd=300000):
-    entries = get_atom_entries()
-    collected = []
-    for ent in entries:
-        idx_url = ent["link"]
+OUT_ALERT_COLS = ["symbol","owners_count","total_usd","last_when"]
+
+def write_alerts(rows=()):
+    """Write alert tuples (OUT_ALERT_COLS order) to OUT_ALERTS_CSV with the csv module; NaN/None -> ''."""
+    with open(OUT_ALERTS_CSV, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(OUT_ALERT_COLS)
+        w.writerows(["" if v is None or v != v else v for v in r] for r in rows)
+
+def _parse_ts(s):
+    """SEC timestamps are ISO 8601; dateutil only for anything fromisoformat rejects."""
+    try:
+        return datetime.fromisoformat(s.strip())
+    except ValueError:
+        return dtp.parse(s)
+
+async def process_entry(session, limiter, sem, ent):
+    """Purchase rows (with filing fields) from the first good XML candidate of one atom entry."""
+    idx_url = ent["link"]
+    async with sem:
         try:
-            xml_candidates = find_xml_candidates(idx_url)
-            got_any = False
+            xml_candidates = await find_xml_candidates(session, limiter, idx_url)
             for xml_url in xml_candidates:
                 try:
-                    xml_text = fetch(xml_url, is_html=True)
+                    xml_bytes = await fetch(session, limiter, xml_url)  # raw bytes: lxml honours the XML's own encoding
                     # quick reject if it doesn't look like a Form 4 ownership doc
-                    if "<nonDerivativeTransaction" not in xml_text and "<issuerTradingSymbol" not in xml_text:
+                    if b"<nonDerivativeTransaction" not in xml_bytes and b"<issuerTradingSymbol" not in xml_bytes:
                         continue
-                    txs = parse_form4_xml(xml_text)
+                    txs = parse_form4_xml(xml_bytes)
                     if not txs:
                         continue
-                    filing_dt = dtp.parse(ent["updated"]).isoformat() if ent["updated"] else datetime.utcnow().isoformat()
-                    for row in txs:
-                        row.update({"filing_dt": filing_dt, "filing_url": idx_url, "xml_url": xml_url})
-                    collected.extend(txs)
-                    got_any = True
-                    break  # use first good xml for this filing
+                    filing_dt = _parse_ts(ent["updated"]).isoformat() if ent["updated"] else datetime.utcnow().isoformat()
+                    return [row + (filing_dt, idx_url, xml_url) for row in txs]  # first good xml wins
                 except Exception as ex_xml:
                     # try next candidate
                     continue
-            time.sleep(0.4)  # politeness
         except Exception as e:
             print(f"[WARN] {idx_url}: {e}")
+    return []
+
+async def collect_purchases():
+    limiter, sem = RateLimiter(SEC_RATE), asyncio.Semaphore(MAX_FILINGS)
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_FILINGS, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout) as session:
+        entries = await get_atom_entries(session, limiter)
+        results = await asyncio.gather(*(process_entry(session, limiter, sem, ent) for ent in entries))
+    return [row for rows in results for row in rows]
+
+def main(days=7, min_owners=3, min_usd=300000):
+    collected = asyncio.run(collect_purchases())
 
     if not collected:
         print("No new Form 4 purchases found.")
-        pd.DataFrame(columns=["symbol","owners_count","total_usd","last_when"]).to_csv(OUT_ALERTS_CSV, index=False)
+        write_alerts()
         return
 
-    df_all = append_trades(collected)
-    alerts = aggregate_alerts(df_all, days=days, min_owners=min_owners, min_usd=min_usd, exclude_10b5=True)
+    append_trades(collected)
+    alerts = aggregate_alerts(load_existing_trades(ALERT_COLS), days=days, min_owners=min_owners, min_usd=min_usd, exclude_10b5=True)
     if alerts.empty:
         print("No tickers crossed thresholds today.")
-        pd.DataFrame(columns=["symbol","owners_count","total_usd","last_when"]).to_csv(OUT_ALERTS_CSV, index=False)
+        write_alerts()
     else:
-        alerts.to_csv(OUT_ALERTS_CSV, index=False)
+        write_alerts(alerts[OUT_ALERT_COLS].itertuples(index=False, name=None))
         print("ALERTS:")
         try:
             print(alerts.to_string(index=False))
@@ -15,7 +15,10 @@ Env (already in your repo secrets):
 
 import os
 import sys
+import csv
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
 from datetime import datetime, timedelta, timezone
 from email.mime.text import MIMEText
 from email.header import Header
@@ -27,11 +30,48 @@ SINCE_UTC = NOW_UTC - timedelta(hours=24)
 US_FILE = "insider_trades.csv"
 TASE_FILE = "tase_trades.csv"
 
-def read_csv_safe(path: str) -> pd.DataFrame:
+# Accepted (lower-case) header names per output field; also decides which CSV columns get read
+US_ALIASES = {
+    "company": ("company","issuer","issuer_name","name"),
+    "ticker":  ("symbol","ticker"),
+    "insider": ("insider","insider_name","holder","reporting_owner"),
+    "role":    ("relationship","role","position","title"),
+    "action":  ("transaction","action","type"),
+    "qty":     ("shares","qty","quantity"),
+    "price":   ("price","avg_price"),
+    "value":   ("value","est_value","value_usd","est_value_usd"),
+    "trade_date":  ("trade_date","transaction_date","transactiondate"),
+    "filing_date": ("filing_date","filed_date","filingdate"),
+    "source":  ("source_url","url","link"),
+}
+TASE_ALIASES = {
+    "company": ("company","issuer","company_name"),
+    "ticker":  ("tase_code","code","ticker"),
+    "insider": ("insider_name","insider","holder","name"),
+    "role":    ("role","relationship","position","title"),
+    "action":  ("action","transaction","type"),
+    "qty":     ("qty","shares","quantity"),
+    "price":   ("avg_price","price","avg_price_nis"),
+    "value":   ("est_value_nis","est_total_nis","value_nis"),
+    "trade_date":  ("trade_date","transaction_date","תאריך עסקה"),
+    "filing_date": ("report_date","filing_date","when","תאריך דיווח"),
+    "source":  ("source_url","url","link"),
+}
+
+def read_csv_safe(path: str, aliases: dict) -> pd.DataFrame:
+    """Read only the columns some alias maps to, all as strings (no date/number inference)."""
     if not os.path.exists(path):
         return pd.DataFrame()
     try:
-        df = pd.read_csv(path)
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            header = next(csv.reader(f), [])
+        wanted = {n for names in aliases.values() for n in names}
+        keep = [h for h in header if h.strip().lower() in wanted]
+        if not keep:
+            return pd.DataFrame()
+        tbl = pacsv.read_csv(path, convert_options=pacsv.ConvertOptions(
+            include_columns=keep, column_types={h: pa.string() for h in keep}))
+        df = tbl.to_pandas()
         # Trim whitespace from headers
         df.columns = [c.strip() for c in df.columns]
         return df
@@ -51,6 +91,7 @@ def normalize_us(df: pd.DataFrame) -> pd.DataFrame:
         return df
 
     # Lower-case columns for flexible mapping
+    A = US_ALIASES
     cols = {c.lower(): c for c in df.columns}
     def col(*names):
         for n in names:
@@ -60,20 +101,20 @@ def normalize_us(df: pd.DataFrame) -> pd.DataFrame:
 
     out = pd.DataFrame()
     out["Market"] = "US"
-    out["Company"] = df[col("company","issuer","issuer_name","name")] if col("company","issuer","issuer_name","name") else ""
-    out["Ticker/Code"] = df[col("symbol","ticker")] if col("symbol","ticker") else ""
-    out["Insider Name"] = df[col("insider","insider_name","holder","reporting_owner")] if col("insider","insider_name","holder","reporting_owner") else ""
-    out["Role"] = df[col("relationship","role","position","title")] if col("relationship","role","position","title") else ""
+    out["Company"] = df[col(*A["company"])] if col(*A["company"]) else ""
+    out["Ticker/Code"] = df[col(*A["ticker"])] if col(*A["ticker"]) else ""
+    out["Insider Name"] = df[col(*A["insider"])] if col(*A["insider"]) else ""
+    out["Role"] = df[col(*A["role"])] if col(*A["role"]) else ""
     # Force action = Sell when scanner already filtered sells; else map if present
-    if col("transaction","action","type"):
-        out["Action"] = df[col("transaction","action","type")]
+    if col(*A["action"]):
+        out["Action"] = df[col(*A["action"])]
     else:
         out["Action"] = "Sell"
-    out["Qty"] = df[col("shares","qty","quantity")] if col("shares","qty","quantity") else ""
-    out["Avg Price"] = df[col("price","avg_price")] if col("price","avg_price") else ""
+    out["Qty"] = df[col(*A["qty"])] if col(*A["qty"]) else ""
+    out["Avg Price"] = df[col(*A["price"])] if col(*A["price"]) else ""
     # Value (local) is USD for US
-    if col("value","est_value","value_usd","est_value_usd"):
-        out["Est. Value (local)"] = df[col("value","est_value","value_usd","est_value_usd")]
+    if col(*A["value"]):
+        out["Est. Value (local)"] = df[col(*A["value"])]
     else:
         # Fallback compute if we have qty and price
         try:
@@ -85,13 +126,13 @@ def normalize_us(df: pd.DataFrame) -> pd.DataFrame:
     out["Currency"] = "USD"
 
     # Dates
-    td_col = col("trade_date","transaction_date","transactiondate")
-    fd_col = col("filing_date","filed_date","filingdate")
+    td_col = col(*A["trade_date"])
+    fd_col = col(*A["filing_date"])
     out["Trade Date"] = df[td_col] if td_col else ""
     out["Filing/Report Date"] = df[fd_col] if fd_col else out["Trade Date"]
 
     # Source link
-    src_col = col("source_url","url","link")
+    src_col = col(*A["source"])
     out["Source"] = df[src_col] if src_col else ""
 
     # Keep only sells if action present
@@ -105,6 +146,7 @@ def normalize_tase(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
 
+    A = TASE_ALIASES
     cols = {c.lower(): c for c in df.columns}
     def col(*names):
         for n in names:
@@ -114,21 +156,21 @@ def normalize_tase(df: pd.DataFrame) -> pd.DataFrame:
 
     out = pd.DataFrame()
     out["Market"] = "TASE"
-    out["Company"] = df[col("company","issuer","company_name")] if col("company","issuer","company_name") else ""
-    out["Ticker/Code"] = df[col("tase_code","code","ticker")] if col("tase_code","code","ticker") else ""
-    out["Insider Name"] = df[col("insider_name","insider","holder","name")] if col("insider_name","insider","holder","name") else ""
-    out["Role"] = df[col("role","relationship","position","title")] if col("role","relationship","position","title") else ""
+    out["Company"] = df[col(*A["company"])] if col(*A["company"]) else ""
+    out["Ticker/Code"] = df[col(*A["ticker"])] if col(*A["ticker"]) else ""
+    out["Insider Name"] = df[col(*A["insider"])] if col(*A["insider"]) else ""
+    out["Role"] = df[col(*A["role"])] if col(*A["role"]) else ""
     # Often all are Sells; still map if present
-    if col("action","transaction","type"):
-        out["Action"] = df[col("action","transaction","type")]
+    if col(*A["action"]):
+        out["Action"] = df[col(*A["action"])]
     else:
         out["Action"] = "Sell"
-    out["Qty"] = df[col("qty","shares","quantity")] if col("qty","shares","quantity") else ""
+    out["Qty"] = df[col(*A["qty"])] if col(*A["qty"]) else ""
     # Avg price may be missing; if we have est total and qty we can compute later
-    out["Avg Price"] = df[col("avg_price","price","avg_price_nis")] if col("avg_price","price","avg_price_nis") else ""
+    out["Avg Price"] = df[col(*A["price"])] if col(*A["price"]) else ""
     # Est value local (NIS)
-    if col("est_value_nis","est_total_nis","value_nis"):
-        out["Est. Value (local)"] = df[col("est_value_nis","est_total_nis","value_nis")]
+    if col(*A["value"]):
+        out["Est. Value (local)"] = df[col(*A["value"])]
     else:
         try:
             qty = pd.to_numeric(out["Qty"], errors="coerce")
@@ -138,12 +180,12 @@ def normalize_tase(df: pd.DataFrame) -> pd.DataFrame:
             out["Est. Value (local)"] = ""
     out["Currency"] = "NIS"
 
-    td_col = col("trade_date","transaction_date","תאריך עסקה")
-    rd_col = col("report_date","filing_date","when","תאריך דיווח")
+    td_col = col(*A["trade_date"])
+    rd_col = col(*A["filing_date"])
     out["Trade Date"] = df[td_col] if td_col else ""
     out["Filing/Report Date"] = df[rd_col] if rd_col else out["Trade Date"]
 
-    src_col = col("source_url","url","link")
+    src_col = col(*A["source"])
     out["Source"] = df[src_col] if src_col else ""
 
     if "Action" in out.columns:
@@ -243,8 +285,8 @@ def send_email(subject: str, html_body: str):
         s.sendmail(FROM, [TO], msg.as_string())
 
 def main():
-    us = read_csv_safe(US_FILE)
-    tase = read_csv_safe(TASE_FILE)
+    us = read_csv_safe(US_FILE, US_ALIASES)
+    tase = read_csv_safe(TASE_FILE, TASE_ALIASES)
 
     us_n = normalize_us(us)
     tase_n = normalize_tase(tase)
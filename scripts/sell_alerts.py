@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 # scripts/sell_alerts.py
-import os, re, time, smtplib, ssl
+import io, os, re, sys, smtplib, ssl, asyncio
+import multiprocessing
 from email.mime.text import MIMEText
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urljoin
 
-import requests
-from bs4 import BeautifulSoup
+import aiohttp
 from dateutil import parser as dtp
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # repo root: insider_scanner
+from insider_scanner import RateLimiter, _cache  # one SEC rate limiter, one HTTP cache schema
 
 # -------- config (from GitHub Secrets / env) ----------
 SEC_EMAIL = os.getenv("SEC_EMAIL") or os.getenv("MAIL_USER") or "you@example.com"
@@ -22,9 +27,12 @@ MAIL_TO   = os.getenv("MAIL_TO", MAIL_USER)
 ATOM_FEED = "https://www.sec.gov/cgi-bin/browse-edgar?action=getcurrent&type=4&count=100&output=atom"
 HEADERS = {
     "User-Agent": f"InsiderWatch/1.0 ({SEC_EMAIL})",
-    "Accept-Encoding": "gzip, deflate",
+    # no Accept-Encoding: the client offers br/zstd on top of gzip when their decoders are installed
     "Connection": "keep-alive",
 }
+SEC_RATE    = 10  # requests/second, SEC's fair-access limit
+MAX_FILINGS = 8   # filings processed concurrently
+PARSE_PROCS = min(4, os.cpu_count() or 1)  # worker processes for Form 4 parsing
 
 # Exclude funds/entities; keep only named people
 EXCLUDE_ENT_RE = re.compile(
@@ -32,56 +40,108 @@ EXCLUDE_ENT_RE = re.compile(
     re.I,
 )
 
-def fetch(url, is_html=False, tries=6, base_sleep=1.5):
+# Form 4 / atom parsing straight on lxml; {*} matches a tag in any (or no) namespace
+_XML_PARSER = etree.XMLParser(recover=True, resolve_entities=False)
+_DOC_OPEN, _DOC_CLOSE = b"<ownershipDocument", b"</ownershipDocument>"
+_SELL_TAGS = ("{*}issuerTradingSymbol", "{*}issuerSymbol", "{*}rptOwnerName", "{*}nonDerivativeTransaction")
+
+def _value_xpath(tag):
+    """Text of the first <tag>'s <value>, or of <tag> itself when it has none; one C-side pass."""
+    el = f"(.//*[local-name()='{tag}'])[1]"
+    return etree.XPath(f"({el}//*[local-name()='value'])[1]/text()[1] | {el}[not(.//*[local-name()='value'])]/text()[1]",
+                       smart_strings=False)
+_SHARES_X, _PRICE_X, _DATE_X = (_value_xpath(t) for t in
+                                ("transactionShares", "transactionPricePerShare", "transactionDate"))
+_NUM_RE = re.compile(r"\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?\s*")  # what float() takes here
+# byte-level prefilter: no sale code anywhere means nothing worth parsing
+_SELL_CODE_RE = re.compile(rb"<(?:[\w.-]+:)?transactionCode>\s*(?:<(?:[\w.-]+:)?value>\s*)?[Ss]\s*<")
+# Index-page links worth trying, matched on the raw bytes
+_HREF_RES = [re.compile(p, re.I) for p in (rb'href="([^"]*ownership\.xml)"',
+                                             rb'href="([^"]*primary_doc\.xml)"',
+                                             rb'href="([^"]*\.xml)"',
+                                             rb'href="([^"]*\.txt)"')]
+
+async def fetch(session, limiter, url, is_html=False, tries=6, base_sleep=1.5):
     """
     Polite fetch with exponential backoff and specific handling for 429.
+    Bodies are cached in insider_scanner's HTTP_CACHE_DB: filed /Archives/ documents never
+    change and are served from disk, anything else is revalidated with ETag/Last-Modified (304 = hit).
     """
-    last = None
+    db = _cache()
+    hit = db.execute("SELECT etag, last_mod, encoding, body FROM cache WHERE url=?", (url,)).fetchone() if db else None
+    immutable = "/Archives/" in url
+    headers = {}
+    if hit:
+        if immutable:
+            return hit[3].decode(hit[2] or "utf-8", errors="replace") if is_html else hit[3]
+        if hit[0]: headers["If-None-Match"] = hit[0]
+        if hit[1]: headers["If-Modified-Since"] = hit[1]
+    status = None
     for i in range(tries):
-        r = requests.get(url, headers=HEADERS, timeout=30)
-        last = r
-        if r.status_code == 200:
-            return r.text if is_html else r.content
+        await limiter.wait()
+        async with session.get(url, headers=headers) as r:
+            status = r.status
+            if status == 304 and hit:
+                body, encoding = hit[3], hit[2]
+                return body.decode(encoding or "utf-8", errors="replace") if is_html else body
+            if status == 200:
+                body, encoding = await r.read(), r.charset
+                etag, last_mod = r.headers.get("ETag"), r.headers.get("Last-Modified")
+                if db and (immutable or etag or last_mod):
+                    db.execute("INSERT OR REPLACE INTO cache VALUES (?,?,?,?,?)",
+                               (url, etag, last_mod, encoding, body))
+                    db.commit()
+                return body.decode(encoding or "utf-8", errors="replace") if is_html else body
+            retry_after = r.headers.get("Retry-After")
 
         # Respect Retry-After on 429
-        if r.status_code == 429:
-            ra = r.headers.get("Retry-After")
+        if status == 429:
             try:
-                wait = int(ra)
+                wait = int(retry_after)
             except Exception:
                 wait = int(base_sleep * (2 ** i))
-            time.sleep(max(wait, 2))
+            await asyncio.sleep(max(wait, 2))
             continue
 
         # Other transient errors → backoff
-        time.sleep(base_sleep * (2 ** i))
+        await asyncio.sleep(base_sleep * (2 ** i))
+
+    raise RuntimeError(f"HTTP {status} for {url}")
 
-    raise RuntimeError(f"HTTP {last.status_code} for {url}")
+def _parse_ts(s):
+    """SEC timestamps are ISO 8601; dateutil only for anything fromisoformat rejects."""
+    try:
+        return datetime.fromisoformat(s.strip())
+    except ValueError:
+        return dtp.parse(s)
 
-def get_atom_entries():
-    html = fetch(ATOM_FEED, is_html=True)
-    soup = BeautifulSoup(html, "lxml-xml")
+def _iso_day(s):
+    """Form 4 dates are YYYY-MM-DD; dateutil only for the odd one that isn't."""
+    try:
+        return date.fromisoformat(s.strip()).isoformat()
+    except ValueError:
+        return dtp.parse(s).date().isoformat()
+
+async def get_atom_entries(session, limiter):
+    root = etree.fromstring(await fetch(session, limiter, ATOM_FEED), _XML_PARSER)
     out = []
-    for e in soup.find_all("entry"):
-        link = e.find("link")
-        if not link or not link.get("href"):
+    for e in (root.iterfind(".//{*}entry") if root is not None else ()):
+        link = e.find(".//{*}link")
+        if link is None or not link.get("href"):
             continue
-        updated = e.find("updated")
+        updated = e.findtext(".//{*}updated")
         out.append({
             "index_url": link.get("href"),
-            "updated": dtp.parse(updated.text).astimezone(timezone.utc) if updated else None,
+            "updated": _parse_ts(updated).astimezone(timezone.utc) if updated is not None else None,
         })
     return out
 
-def find_xml_candidates(index_url):
-    html = fetch(index_url, is_html=True)
+async def find_xml_candidates(session, limiter, index_url):
+    page = await fetch(session, limiter, index_url)
     cands = set()
-    for pat in [r'href="([^"]*ownership\.xml)"',
-                r'href="([^"]*primary_doc\.xml)"',
-                r'href="([^"]*\.xml)"',
-                r'href="([^"]*\.txt)"']:
-        for m in re.finditer(pat, html, flags=re.I):
-            cands.add(urljoin(index_url, m.group(1)))
+    for pat in _HREF_RES:
+        for m in pat.finditer(page):
+            cands.add(urljoin(index_url, m.group(1).decode("utf-8", "replace")))
     return list(cands)
 
 def parse_form4_sells(xml_bytes):
@@ -90,52 +150,59 @@ def parse_form4_sells(xml_bytes):
     {symbol, owner, shares, price, amount_usd, txn_date}
     (filters: people only; amount >= MIN_USD)
     """
-    text = xml_bytes.decode("utf-8", errors="ignore")
-    soup = BeautifulSoup(text, "lxml-xml")
+    if not _SELL_CODE_RE.search(xml_bytes):
+        return []
+    # a .txt submission wraps the ownership document; parse just that span
+    i = xml_bytes.find(_DOC_OPEN)
+    j = xml_bytes.find(_DOC_CLOSE, i)
+    if i != -1 and j != -1:
+        xml_bytes = xml_bytes[i:j + len(_DOC_CLOSE)]
 
-    sym_tag = soup.find("issuerTradingSymbol") or soup.find("issuerSymbol")
-    symbol = (sym_tag.text or "").strip().upper() if sym_tag else None
+    def value(tr, xpath):
+        v = xpath(tr)
+        return v[0] if v else None
 
-    # choose first human reporter
-    owner = None
-    for ro in soup.find_all("reportingOwner"):
-        nm = ro.find("rptOwnerName")
-        if not nm:
-            continue
-        name = (nm.text or "").strip()
-        if not EXCLUDE_ENT_RE.search(name):
-            owner = name
-            break
+    # walk the document one element at a time, dropping each transaction once read;
+    # the people-only decision is per filing, so it's made once, at the first transaction
+    syms, owner, rows = {}, None, []
+    context = etree.iterparse(io.BytesIO(xml_bytes), events=("end",), tag=_SELL_TAGS,
+                              recover=True, resolve_entities=False)
+    try:
+        for _, el in context:
+            tag = etree.QName(el).localname
+            if tag == "nonDerivativeTransaction":
+                if owner is None:
+                    return []  # reporters precede the table: all of them were entities
+                code = (el.findtext(".//{*}transactionCode") or "").strip().upper()
+                if code == "S":
+                    rows.append((value(el, _SHARES_X), value(el, _PRICE_X), value(el, _DATE_X)))
+                el.clear()
+                while el.getprevious() is not None:
+                    del el.getparent()[0]
+            elif tag == "rptOwnerName":
+                # choose first human reporter
+                name = (el.text or "").strip()
+                if owner is None and not EXCLUDE_ENT_RE.search(name):
+                    owner = name
+            else:
+                syms.setdefault(tag, (el.text or "").strip().upper())
+    except etree.XMLSyntaxError:
+        pass  # truncated tail: keep what was read
+    symbol = syms.get("issuerTradingSymbol", syms.get("issuerSymbol"))
     if not owner:
         return []  # only people
 
     sells = []
-    for tr in soup.find_all("nonDerivativeTransaction"):
-        code = tr.find("transactionCode")
-        code = (code.text or "").strip().upper() if code else ""
-        if code != "S":
-            continue
-        sh = tr.find("transactionShares")
-        pr = tr.find("transactionPricePerShare")
-        dt = tr.find("transactionDate")
-        try:
-            shares = float((sh.value.text if (sh and sh.value) else sh.text))
-        except Exception:
-            shares = 0.0
-        try:
-            price = float((pr.value.text if (pr and pr.value) else pr.text))
-        except Exception:
-            price = 0.0
+    for shares, price, when in rows:
+        shares = float(shares) if shares and _NUM_RE.fullmatch(shares) else 0.0
+        price = float(price) if price and _NUM_RE.fullmatch(price) else 0.0
         amt = shares * price
         if amt < MIN_USD:
             continue
-        when = None
-        if dt:
-            v = dt.find("value") or dt
-            try:
-                when = dtp.parse(v.text).date().isoformat()
-            except Exception:
-                when = None
+        try:
+            when = _iso_day(when)
+        except Exception:
+            when = None
         sells.append({
             "symbol": symbol,
             "owner": owner,
@@ -146,38 +213,70 @@ def parse_form4_sells(xml_bytes):
         })
     return sells
 
-def send_email(subject, body):
-    if not (MAIL_USER and MAIL_PASS and MAIL_TO and MAIL_FROM):
+SMTP_MAX_PER_CONN = 10000  # reconnect after this many messages on one session
+
+def send_emails(messages):
+    """Send (subject, body, to) messages over one authenticated SMTP session
+    (STARTTLS + login once), reconnecting every SMTP_MAX_PER_CONN messages."""
+    messages = list(messages)
+    if not (MAIL_USER and MAIL_PASS and MAIL_FROM) or not all(to for _, _, to in messages):
         print("[WARN] Missing mail creds; skip email.")
         return
-    msg = MIMEText(body, "plain", "utf-8")
-    msg["Subject"] = subject
-    msg["From"] = MAIL_FROM
-    msg["To"] = MAIL_TO
     ctx = ssl.create_default_context()
-    with smtplib.SMTP("smtp.gmail.com", 587) as s:
-        s.starttls(context=ctx)
-        s.login(MAIL_USER, MAIL_PASS)
-        s.sendmail(MAIL_FROM, [MAIL_TO], msg.as_string())
+    for start in range(0, len(messages), SMTP_MAX_PER_CONN):
+        with smtplib.SMTP("smtp.gmail.com", 587) as s:
+            s.ehlo()
+            s.starttls(context=ctx)
+            s.ehlo()
+            s.login(MAIL_USER, MAIL_PASS)
+            for subject, body, to in messages[start:start + SMTP_MAX_PER_CONN]:
+                msg = MIMEText(body, "plain", "utf-8")
+                msg["Subject"] = subject
+                msg["From"] = MAIL_FROM
+                msg["To"] = to
+                s.send_message(msg)
 
-def main():
-    since = datetime.now(timezone.utc) - timedelta(hours=LOOKBACK_HOURS)
-    entries = [e for e in get_atom_entries() if (e["updated"] or since) >= since]
+def send_email(subject, body):
+    send_emails([(subject, body, MAIL_TO)])
 
-    hits = []
-    for e in entries:
-        for cand in find_xml_candidates(e["index_url"]):
+async def process_entry(session, limiter, sem, pool, e):
+    """Sell rows (with filing fields) from the first candidate XML of one atom entry that has any."""
+    loop = asyncio.get_running_loop()
+    async with sem:
+        try:
+            cands = await find_xml_candidates(session, limiter, e["index_url"])
+        except Exception as ex:
+            print(f"[WARN] {e['index_url']}: {ex}")
+            return []
+        for cand in cands:
             try:
-                xml = fetch(cand)
+                xml = await fetch(session, limiter, cand)
             except Exception:
                 continue
-            rows = parse_form4_sells(xml)
+            if not _SELL_CODE_RE.search(xml):
+                continue  # no sale code; skip the trip to the pool
+            rows = await loop.run_in_executor(pool, parse_form4_sells, xml)  # CPU-bound; keeps the loop fetching
             if rows:
                 for r in rows:
                     r["filing_url"] = e["index_url"]
                     r["xml_url"] = cand
-                hits.extend(rows)
-                break  # first good candidate is enough
+                return rows  # first good candidate is enough
+    return []
+
+async def collect_sells(since):
+    limiter, sem = RateLimiter(SEC_RATE), asyncio.Semaphore(MAX_FILINGS)
+    connector = aiohttp.TCPConnector(limit=MAX_FILINGS, limit_per_host=MAX_FILINGS, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=30)
+    # spawned, not forked: workers start on first use, after aiohttp's resolver threads exist
+    with ProcessPoolExecutor(max_workers=PARSE_PROCS, mp_context=multiprocessing.get_context("spawn")) as pool:
+        async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout) as session:
+            entries = [e for e in await get_atom_entries(session, limiter) if (e["updated"] or since) >= since]
+            results = await asyncio.gather(*(process_entry(session, limiter, sem, pool, e) for e in entries))
+    return [r for rows in results for r in rows]
+
+def main():
+    since = datetime.now(timezone.utc) - timedelta(hours=LOOKBACK_HOURS)
+    hits = asyncio.run(collect_sells(since))
 
     # group + format
     by_symbol = {}
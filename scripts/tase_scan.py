@@ -1,17 +1,36 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, re, time, io, sys, math, csv, json
+import os, re, time, io, sys, math, csv, json, sqlite3, threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timezone
+from html import unescape as html_unescape
 import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-
-# pdf text extraction
-from pdfminer.high_level import extract_text as pdf_extract_text
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+from lxml import etree, html as lxml_html
 
 UA = {"User-Agent": "Mozilla/5.0 (compatible; TASEScanner/1.0)"}
 
+# One pooled keep-alive session for all MAYA requests. Retries (429/5xx, honouring
+# Retry-After) are kept short so a flaky id can't eat the run's TIME_BUDGET_S.
+_RETRY = Retry(
+    total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+    respect_retry_after_header=True, allowed_methods=["GET"], raise_on_status=False)
+_session = requests.Session()
+_session.headers.update(UA)
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=_RETRY)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+# The id probes go straight to urllib3: requests' per-call overhead (request prep, hooks,
+# cookie jar) is most of the Python time for hundreds of small, mostly-404 GETs.
+_http = urllib3.PoolManager(num_pools=4, maxsize=32, headers={**UA, **make_headers(accept_encoding=True)},
+                            retries=_RETRY)
+
 # ------------------------
 # Env + state management
 # ------------------------
@@ -36,17 +55,37 @@ LAST_ID_SEED   = getenv_int("TASE_LAST_ID", 1702700)
 SCAN_AHEAD     = getenv_int("TASE_SCAN_AHEAD", 180)
 SLEEP_SEC      = getenv_float("TASE_SLEEP", 0.25)
 TIME_BUDGET_S  = getenv_int("TIME_BUDGET_S", 420)
+WORKERS        = getenv_int("TASE_WORKERS", 12)
 MIN_NIS        = getenv_float("MIN_NIS", 0.0)
+TRY_PDF        = getenv_int("TASE_TRY_PDF", 0)  # 1 = also try the PDF attachment when both htm tiers miss
 
 STATE_FILE = ".tase_state.txt"
 LOG_FILE   = "tase.log"
+CACHE_DB   = getenv_str("TASE_HTTP_CACHE", ".tase_cache.sqlite")  # "" disables
+
+_log_lock = threading.Lock()
 
 def log(msg):
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     line = f"[{ts}] {msg}"
-    print(line, flush=True)
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(line + "\n")
+    with _log_lock:  # probes log from worker threads
+        print(line, flush=True)
+        with open(LOG_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+class RateLimiter:
+    """Spaces request starts `interval` seconds apart across all threads."""
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0: time.sleep(delay)
 
 def read_state():
     # If file exists and valid → use it; else use seed
@@ -60,9 +99,12 @@ def read_state():
     return LAST_ID_SEED
 
 def write_state(last_id):
+    # write-then-rename: a run killed mid-write leaves the old state, never a truncated one
+    tmp = STATE_FILE + ".tmp"
     try:
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
+        with open(tmp, "w", encoding="utf-8") as f:
             f.write(str(last_id))
+        os.replace(tmp, STATE_FILE)
     except Exception as e:
         log(f"WARN: failed writing state: {e}")
 
@@ -81,24 +123,115 @@ def maya_htm_attachment(report_id: int) -> str:
 def maya_pdf_attachment(report_id: int) -> str:
     return f"https://maya.tase.co.il/he/reports/{report_id}?attachmentType=pdf1"
 
-def fetch_text(url: str, timeout=15) -> str:
-    r = requests.get(url, headers=UA, timeout=timeout, allow_redirects=True)
-    ct = r.headers.get("Content-Type", "")
+def pdf_text(data: bytes) -> str:
+    # PDFium (native, ~10x faster) when installed, pdfminer otherwise. Imported here, not at
+    # the top: together they add ~150 ms to every start, and most runs never see a PDF.
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+    if pdfium is not None:
+        try:
+            doc = pdfium.PdfDocument(data)
+            try:
+                return "\n".join(p.get_textpage().get_text_bounded() for p in doc).replace("\r\n", "\n")
+            finally:
+                doc.close()
+        except pdfium.PdfiumError:
+            pass  # something PDFium can't open; pdfminer is more forgiving
+    from pdfminer.high_level import extract_text as pdf_extract_text
+    return pdf_extract_text(io.BytesIO(data)) or ""
+
+# PDFium must not be entered from several threads at once and pdfminer holds the GIL, so the
+# probe threads hand PDFs to worker processes. Spawned, not forked: the parent has threads.
+PDF_PROCS = min(4, os.cpu_count() or 1)
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def pdf_text_isolated(data: bytes) -> str:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_PROCS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pdf_pool.submit(pdf_text, data).result()
+
+# Published reports never change, so the text a report URL yielded is kept and reused
+# across runs. Misses (404s) are not stored: an id past the newest report appears later.
+_cache_conn = None
+_cache_lock = threading.Lock()
+
+def _cache():
+    global _cache_conn
+    if _cache_conn is None and CACHE_DB:
+        _cache_conn = sqlite3.connect(CACHE_DB, check_same_thread=False)
+        _cache_conn.execute("CREATE TABLE IF NOT EXISTS cache(url TEXT PRIMARY KEY, text TEXT)")
+    return _cache_conn
+
+def fetch_report_text(url: str) -> str:
+    """probe_text() for an immutable report URL, served from CACHE_DB once seen."""
+    with _cache_lock:
+        db = _cache()
+        hit = db.execute("SELECT text FROM cache WHERE url=?", (url,)).fetchone() if db else None
+    if hit:
+        return hit[0]
+    text = probe_text(url)
+    if db and text:
+        with _cache_lock:
+            db.execute("INSERT OR REPLACE INTO cache VALUES (?,?)", (url, text))
+            db.commit()
+    return text
+
+_CT_CHARSET   = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+_META_CHARSET = re.compile(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", re.I)
+
+def page_encoding(content_type: str, body: bytes) -> str:
+    """Declared charset (header, then <meta>), else UTF-8 if it decodes, else Windows-1255.
+       MAYA pages are one or the other, so there's no need for a statistical guess over the body."""
+    m = _CT_CHARSET.search(content_type) or _META_CHARSET.search(body[:4096])
+    if m:
+        enc = m.group(1)
+        return enc.decode("ascii") if isinstance(enc, bytes) else enc
+    if body.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    try:
+        body.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "windows-1255"
+
+def body_text(url: str, ct: str, body: bytes) -> str:
     if "application/pdf" in ct or url.lower().endswith(".pdf"):
         # convert pdf bytes to text
-        text = pdf_extract_text(io.BytesIO(r.content))
-        return text or ""
-    else:
-        r.encoding = r.apparent_encoding or "utf-8"
-        return r.text or ""
+        return pdf_text_isolated(body)
+    try:
+        return body.decode(page_encoding(ct, body), errors="replace")
+    except LookupError:  # unknown declared charset
+        return body.decode("utf-8", errors="replace")
+
+def fetch_text(url: str, timeout=15) -> str:
+    r = _session.get(url, timeout=timeout, allow_redirects=True)
+    if r.status_code != 200:
+        # a missing id is a 404 page; don't decode or parse it, let the caller try the next URL
+        raise RuntimeError(f"HTTP {r.status_code}")
+    return body_text(url, r.headers.get("Content-Type", ""), r.content)
+
+def probe_text(url: str, timeout=15) -> str:
+    """fetch_text() over the bare urllib3 pool, for the Mode B id probes."""
+    r = _http.request("GET", url, timeout=timeout)
+    if r.status != 200:
+        raise RuntimeError(f"HTTP {r.status}")
+    return body_text(url, r.headers.get("Content-Type", ""), r.data)
 
 def try_fetch_report_text(report_id: int):
-    # Try stable order: mayafiles H*.htm → maya htm attachment → maya pdf attachment
-    for url in (mayafiles_htm_url(report_id),
-                maya_htm_attachment(report_id),
-                maya_pdf_attachment(report_id)):
+    # Try stable order: mayafiles H*.htm → maya htm attachment (→ maya pdf attachment if TRY_PDF).
+    # Most ids probed are misses, so each extra tier is a round trip paid on nearly every id.
+    urls = [mayafiles_htm_url(report_id), maya_htm_attachment(report_id)]
+    if TRY_PDF:
+        urls.append(maya_pdf_attachment(report_id))
+    for url in urls:
         try:
-            t = fetch_text(url)
+            t = fetch_report_text(url)
             if t and len(t) > 100:
                 return url, t
         except Exception as e:
@@ -119,11 +252,34 @@ RE_QTY_DOWN  = re.compile(r"שינוי\s+בכמות\s+ניירות\s+הערך[:\
 RE_PRICE_AG  = re.compile(r"שער\s+העסקה[:\s]+([\d\.,]+)\s*.*אג", re.UNICODE)
 
 # “חדל להיות בעל ענין” cards (Gencell example)
+RE_NON_DIGIT = re.compile(r"[^\d]")
 RE_STOP_BEI  = re.compile(r"חדל\s+להיות\s+בעל\s+ענין", re.UNICODE)
 
+RE_HTML_TAG  = re.compile(r"<html", re.I)  # same test as '"<html" in page.lower()', without copying the page
+
+def may_hold_trades(page: str) -> bool:
+    """Cheap test on the raw page, before any tree is built: extract_trades_from_text only
+       returns rows for text with קיטון and מכירה (sale) or חדל (ceased)."""
+    if "&#" in page:  # markup can't add those words to the text, character references can
+        page = html_unescape(page)
+    return ("קיטון" in page and "מכירה" in page) or "חדל" in page
+
+def _html_doc(html: str):
+    try:
+        return lxml_html.fromstring(html)
+    except ValueError:  # str input carrying an XML encoding declaration
+        return lxml_html.fromstring(html.encode("utf-8"))
+
+# Text nodes outside script/style/template, each its own item; comments aren't text nodes,
+# so the text either side of one stays on separate lines instead of running together
+_TEXT_NODES = etree.XPath("//text()[not(ancestor::script or ancestor::style or ancestor::template)]",
+                          smart_strings=False)
+
 def text_from_html(html: str) -> str:
-    soup = BeautifulSoup(html, "lxml")
-    return soup.get_text("\n", strip=True)
+    """Visible text of an HTML page, one stripped text node per line."""
+    if not html.strip():
+        return ""
+    return "\n".join(t for t in (s.strip() for s in _TEXT_NODES(_html_doc(html))) if t)
 
 def extract_trades_from_text(text: str, report_id: int, src_url: str):
     """
@@ -147,7 +303,7 @@ def extract_trades_from_text(text: str, report_id: int, src_url: str):
     qty = None
     m = RE_QTY_DOWN.search(text)
     if m:
-        qty = int(re.sub(r"[^\d]", "", m.group(1)))
+        qty = int(RE_NON_DIGIT.sub("", m.group(1)))
 
     price_agorot = None
     m = RE_PRICE_AG.search(text)
@@ -188,29 +344,59 @@ def extract_trades_from_text(text: str, report_id: int, src_url: str):
 
     return out
 
+# ------------------------
+# Output
+# ------------------------
+TRADE_COLS = ["company", "tase_code", "qty_sold", "price_agorot",
+              "est_total_nis", "report_id", "url", "kind"]
+ALERT_COLS = ["company", "tase_code", "trades", "est_total_nis", "when"]
+
+def _group_key(kv):
+    # sort (company, tase_code) like a groupby would, missing values last
+    return tuple((k is None, k or "") for k in kv[0])
+
+def write_csv(path, cols, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(cols)
+        w.writerows(["" if v is None else v for v in r] for r in rows)
+
 # ------------------------
 # Main
 # ------------------------
 def main():
     start_time = time.time()
     rows = []
+    limiter = RateLimiter(SLEEP_SEC)
 
     if LINKS:
         # Mode A: explicit links (space/newline separated)
         urls = [u for u in re.split(r"[\s\r\n]+", LINKS) if u.strip()]
         log(f"MODE A: parsing {len(urls)} provided URLs")
-        for u in urls:
+
+        def parse_link(u):
+            """Trade rows for one link; None if the time budget ran out first."""
             if time.time() - start_time > TIME_BUDGET_S:
-                log("Time budget reached; stopping.")
-                break
+                return None
+            limiter.wait()
             try:
                 txt = fetch_text(u)
-                if "<html" in txt.lower():
+                if not may_hold_trades(txt):
+                    return []
+                if RE_HTML_TAG.search(txt):
                     txt = text_from_html(txt)
-                rows.extend(extract_trades_from_text(txt, report_id=0, src_url=u))
-                time.sleep(SLEEP_SEC)
+                return extract_trades_from_text(txt, report_id=0, src_url=u)
             except Exception as e:
                 log(f"ERROR parsing {u}: {e}")
+                return []
+
+        # same pool + limiter as Mode B; rows keep the order the links were given in
+        with ThreadPoolExecutor(max_workers=WORKERS) as ex:
+            for got in ex.map(parse_link, urls):
+                if got is None:
+                    log("Time budget reached; stopping.")
+                    break
+                rows.extend(got)
 
         # No state updates in Mode A
     else:
@@ -218,67 +404,57 @@ def main():
         last_id = read_state()
         log(f"MODE B: auto-scan starting at id={last_id} window={SCAN_AHEAD}")
 
-        scanned = 0
-        cur = last_id
         end_id = last_id + SCAN_AHEAD - 1
 
-        while cur <= end_id:
+        def probe(rid):
+            """Trade rows for one report id; None if the time budget ran out first."""
             if time.time() - start_time > TIME_BUDGET_S:
-                log("Time budget reached; stopping.")
-                break
-
-            url, txt = try_fetch_report_text(cur)
-            if txt:
-                if "<html" in txt.lower():
-                    txt2 = text_from_html(txt)
-                else:
-                    txt2 = txt
-                rows.extend(extract_trades_from_text(txt2, report_id=cur, src_url=url))
-            else:
-                log(f"MISS {cur}")
-
-            scanned += 1
-            cur += 1
-            time.sleep(SLEEP_SEC)
+                return None
+            limiter.wait()
+            url, txt = try_fetch_report_text(rid)
+            if not txt:
+                log(f"MISS {rid}")
+                return []
+            if not may_hold_trades(txt):
+                return []
+            if RE_HTML_TAG.search(txt):
+                txt = text_from_html(txt)
+            return extract_trades_from_text(txt, report_id=rid, src_url=url)
+
+        # probes run concurrently; results come back in id order, so the state
+        # only advances past ids that (and all before them) were actually scanned
+        cur = last_id
+        with ThreadPoolExecutor(max_workers=WORKERS) as ex:
+            for got in ex.map(probe, range(last_id, end_id + 1)):
+                if got is None:
+                    log("Time budget reached; stopping.")
+                    break
+                rows.extend(got)
+                cur += 1
 
         # Persist next starting id to avoid rescanning
         write_state(cur)
 
-    # Build DataFrames + filter + save
+    # Filter + save; a run yields a few dozen rows at most, so plain lists beat a DataFrame
+    # filter by MIN_NIS when applicable
+    rows = [r for r in rows
+            if not (r.get("kind") == "sale" and r.get("est_total_nis")) or r["est_total_nis"] >= MIN_NIS]
+
+    # Aggregate alerts by company
+    by_co = {}
+    for r in rows:
+        ag = by_co.setdefault((r.get("company"), r.get("tase_code")), [0, []])
+        ag[0] += r.get("report_id") is not None
+        ag[1].append(r.get("est_total_nis") or 0.0)
+    when = datetime.now(timezone.utc).isoformat()
+
+    write_csv("tase_trades.csv", TRADE_COLS, ([r.get(c) for c in TRADE_COLS] for r in rows))
+    write_csv("tase_alerts.csv", ALERT_COLS,
+              ([co, code, n, math.fsum(nis), when] for (co, code), (n, nis) in sorted(by_co.items(), key=_group_key)))
     if rows:
-        df = pd.DataFrame(rows)
-
-        # filter by MIN_NIS when applicable
-        def pass_filter(r):
-            if r.get("kind") == "sale" and r.get("est_total_nis"):
-                return r["est_total_nis"] >= MIN_NIS
-            return True
-
-        df = df[df.apply(pass_filter, axis=1)].reset_index(drop=True)
-
-        # Save raw trades
-        df_cols = ["company", "tase_code", "qty_sold", "price_agorot",
-                   "est_total_nis", "report_id", "url", "kind"]
-        for c in df_cols:
-            if c not in df.columns:
-                df[c] = None
-        df[df_cols].to_csv("tase_trades.csv", index=False, encoding="utf-8")
-
-        # Aggregate alerts by company
-        ag = (df.groupby(["company", "tase_code"], dropna=False)
-                .agg(trades=("report_id","count"),
-                     est_total_nis=("est_total_nis","sum"))
-                .reset_index())
-        ag["when"] = datetime.now(timezone.utc).isoformat()
-        ag.to_csv("tase_alerts.csv", index=False, encoding="utf-8")
-
-        log(f"SAVED: {len(df)} trade rows; {len(ag)} alert rows")
+        log(f"SAVED: {len(rows)} trade rows; {len(by_co)} alert rows")
     else:
-        # still emit headers so the artifact exists
-        pd.DataFrame(columns=["company","tase_code","qty_sold","price_agorot",
-                              "est_total_nis","report_id","url","kind"]).to_csv("tase_trades.csv", index=False, encoding="utf-8")
-        pd.DataFrame(columns=["company","tase_code","trades","est_total_nis","when"]).to_csv("tase_alerts.csv", index=False, encoding="utf-8")
-        log("No rows this run.")
+        log("No rows this run.")  # headers are still written so the artifacts exist
 
 if __name__ == "__main__":
     # fresh log each run
@@ -1,9 +1,8 @@
 #!/usr/bin/env python3
 # Temporary TASE stub: creates empty CSVs and (optionally) emails to confirm wiring.
-import os, ssl, smtplib
+import os, csv, ssl, smtplib
 from email.mime.text import MIMEText
 from datetime import datetime, timezone
-import pandas as pd
 
 MAIL_USERNAME = os.getenv("MAIL_USERNAME")
 MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
@@ -11,13 +10,12 @@ FROM_EMAIL    = os.getenv("FROM_EMAIL", MAIL_USERNAME)
 TO_EMAIL      = os.getenv("TO_EMAIL", MAIL_USERNAME)
 
 # Create empty TASE CSV artifacts (schemas we’ll populate later)
-pd.DataFrame(columns=[
-    "symbol","owner","shares","price_nis","amount_nis","txn_date","report_url"
-]).to_csv("insider_trades_tase.csv", index=False)
-
-pd.DataFrame(columns=[
-    "symbol","owners_count","total_nis","last_when"
-]).to_csv("alerts_tase.csv", index=False)
+for path, cols in (
+    ("insider_trades_tase.csv", ["symbol","owner","shares","price_nis","amount_nis","txn_date","report_url"]),
+    ("alerts_tase.csv", ["symbol","owners_count","total_nis","last_when"]),
+):
+    with open(path, "w", newline="") as f:
+        csv.writer(f, lineterminator="\n").writerow(cols)
 
 subject = "[InsiderWatch] TASE Insider SELLs — stub OK"
 body = (
@@ -6,15 +6,20 @@ import re
 import sys
 import ssl
 import csv
-import time
 import smtplib
+import sqlite3
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
+from html import unescape as html_unescape
 from datetime import datetime, timezone
 from urllib.parse import urljoin, urlparse, parse_qs
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import etree, html as lxml_html
 
 # ---------- Config via env ----------
 FROM_EMAIL    = os.getenv("FROM_EMAIL")
@@ -31,38 +36,100 @@ TASE_RSS_URLS = [u.strip() for u in (os.getenv("TASE_RSS_URLS", "") or "").split
 # Floor for reporting (in NIS). Start with 0; raise later if too noisy.
 MIN_NIS = float(os.getenv("MIN_NIS", "0"))
 
+# Report pages fetched at once; each is one slow round trip to MAYA
+WORKERS = int(os.getenv("TASE_WORKERS", "8"))
+
 # Outputs
 OUT_ALERTS = "tase_alerts.csv"   # per-run summary
 OUT_TRADES = "tase_trades.csv"   # detailed rows
 OUT_LOG    = "tase.log"
 
+# Report pages, shared with scripts/tase_scan.py (same table, same URL keys); "" disables
+CACHE_DB   = os.getenv("TASE_HTTP_CACHE", ".tase_cache.sqlite")
+
 HEADERS = {
     "User-Agent": "TASE-InsiderWatch/1.0 (+mail:{})".format(MAIL_USERNAME or "unknown"),
-    "Accept-Encoding": "gzip, deflate",
+    "Accept": "text/html,application/xhtml+xml",
+    # no Accept-Encoding: the client offers br/zstd on top of gzip when their decoders are installed
     "Connection": "keep-alive",
 }
 
+# One pooled session for every MAYA request; urllib3 retries 429/5xx with backoff + Retry-After
+_session = requests.Session()
+_session.headers.update(HEADERS)
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=Retry(
+    total=6, backoff_factor=1.2, status_forcelist=[429, 500, 502, 503, 504],
+    respect_retry_after_header=True, allowed_methods=["GET"], raise_on_status=False))
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
 # ---------- Helpers ----------
 
+_log_lock = threading.Lock()
+
 def log(msg: str):
     ts = datetime.now(timezone.utc).isoformat()
     line = f"[{ts}] {msg}"
-    print(line)
+    with _log_lock:  # report pages are scanned from worker threads
+        print(line)
+        try:
+            with open(OUT_LOG, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except Exception:
+            pass
+
+_CT_CHARSET   = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+_META_CHARSET = re.compile(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", re.I)
+
+def page_encoding(content_type: str, body: bytes) -> str:
+    """Declared charset (header, then <meta>), else UTF-8 if it decodes, else Windows-1255.
+       requests would fall back to ISO-8859-1 for charset-less text/html, or run chardet."""
+    m = _CT_CHARSET.search(content_type) or _META_CHARSET.search(body[:4096])
+    if m:
+        enc = m.group(1)
+        return enc.decode("ascii") if isinstance(enc, bytes) else enc
+    if body.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
     try:
-        with open(OUT_LOG, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
-    except Exception:
-        pass
-
-def fetch(url: str, is_html: bool = True, tries: int = 3, sleep_sec: float = 1.2) -> str:
-    last = None
-    for i in range(tries):
-        r = requests.get(url, headers=HEADERS, timeout=30)
-        last = r
-        if r.status_code == 200:
-            return r.text if is_html else r.content
-        time.sleep(sleep_sec * (i + 1))
-    raise RuntimeError(f"HTTP {last.status_code if last else '??'} for {url}")
+        body.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "windows-1255"
+
+def fetch(url: str, is_html: bool = True) -> str:
+    r = _session.get(url, timeout=30)
+    if r.status_code == 200:
+        if not is_html:
+            return r.content
+        r.encoding = page_encoding(r.headers.get("Content-Type", ""), r.content)
+        return r.text
+    raise RuntimeError(f"HTTP {r.status_code} for {url}")
+
+# A published report never changes, so a report page fetched once is reused on later runs.
+# Listing pages do change and always go to the network.
+_cache_conn = None
+_cache_lock = threading.Lock()
+
+def _cache():
+    global _cache_conn
+    if _cache_conn is None and CACHE_DB:
+        _cache_conn = sqlite3.connect(CACHE_DB, check_same_thread=False)
+        _cache_conn.execute("CREATE TABLE IF NOT EXISTS cache(url TEXT PRIMARY KEY, text TEXT)")
+    return _cache_conn
+
+def fetch_report(url: str) -> str:
+    """fetch() for a report page, served from CACHE_DB once seen."""
+    with _cache_lock:
+        db = _cache()
+        hit = db.execute("SELECT text FROM cache WHERE url=?", (url,)).fetchone() if db else None
+    if hit:
+        return hit[0]
+    html = fetch(url, is_html=True)
+    if db and html:
+        with _cache_lock:
+            db.execute("INSERT OR REPLACE INTO cache VALUES (?,?)", (url, html))
+            db.commit()
+    return html
 
 def normalize_report_url(url: str) -> str:
     """
@@ -78,6 +145,26 @@ def normalize_report_url(url: str) -> str:
         pass
     return url
 
+def _html_doc(html: str):
+    try:
+        return lxml_html.fromstring(html)
+    except ValueError:  # str input carrying an XML encoding declaration
+        return lxml_html.fromstring(html.encode("utf-8"))
+
+# Text nodes outside script/style/template, each its own item; comments aren't text nodes,
+# so the text either side of one stays on separate lines instead of running together
+_TEXT_NODES = etree.XPath("//text()[not(ancestor::script or ancestor::style or ancestor::template)]",
+                          smart_strings=False)
+
+def text_from_html(html: str) -> str:
+    """Visible text of an HTML page, one stripped text node per line."""
+    if not html.strip():
+        return ""
+    return "\n".join(t for t in (s.strip() for s in _TEXT_NODES(_html_doc(html))) if t)
+
+# hrefs of <a> tags pointing at a report; the filter runs inside libxml2, not per href in Python
+_REPORT_HREFS = etree.XPath('//a/@href[contains(., "/reports/")]', smart_strings=False)
+
 def discover_report_links(container_url: str) -> list:
     """
     If the provided URL is a listing/search page, extract links to individual reports.
@@ -93,21 +180,9 @@ def discover_report_links(container_url: str) -> list:
     except Exception as e:
         log(f"fetch list failed: {u} :: {e}")
         return []
-    soup = BeautifulSoup(html, "lxml")
-    links = []
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
-        if "/reports/" in href:
-            full = urljoin(u, href)
-            links.append(normalize_report_url(full))
-    # De-dup, keep order
-    seen = set()
-    out = []
-    for link in links:
-        if link not in seen:
-            seen.add(link)
-            out.append(link)
-    return out
+    # dict keys de-dup while keeping first-seen order
+    hrefs = _REPORT_HREFS(_html_doc(html)) if html.strip() else ()
+    return list(dict.fromkeys(normalize_report_url(urljoin(u, href)) for href in hrefs))
 
 _HEB_NUM = re.compile(r"[0-9,\.\-]+")
 def _to_num(s):
@@ -122,25 +197,46 @@ def _to_num(s):
         return None
 
 DATE_PAT = re.compile(r"(\d{1,2}/\d{1,2}/\d{2,4})")
+PAPER_PAT = re.compile(r"מספר נייר(?:\s+ערך)?(?:\s+בבורסה)?\s*:\s*([0-9]+)")
+# the line breaks str.splitlines() honours, so a line can be cut out without splitting the whole text
+_EOL = re.compile(r"\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+
+def _head_lines(text, n):
+    return _EOL.split(text, n)[:n]
+
+_label_variants = {}  # label -> spellings _find_after tries, built once per label
 
 def _find_after(label, text):
     """
     Find the Hebrew label and return the rest of the line after it.
     Tries a few common label variants.
     """
-    variants = [
-        label,
-        label.replace(":", " :"),
-        label.replace(":", ""),
-    ]
+    variants = _label_variants.get(label)
+    if variants is None:
+        # dict.fromkeys drops repeats, so a label without ":" is searched once, not three times
+        variants = _label_variants[label] = tuple(dict.fromkeys((
+            label,
+            label.replace(":", " :"),
+            label.replace(":", ""),
+        )))
     for v in variants:
         idx = text.find(v)
         if idx >= 0:
             # take rest of that line
-            line = text[idx:].splitlines()[0]
+            eol = _EOL.search(text, idx)
+            line = text[idx:eol.start()] if eol else text[idx:]
             return line[len(v):].strip(" :\u200f\u200e")
     return None
 
+# parse_hebrew_report only emits an event when one of these reaches the page text: the ceased
+# phrase, or one of the two labels a sell is read from (change in quantity, nature of change)
+_EVENT_GATES = ("חדל להיות בעל", "שינוי בכמות ניירות הערך", "מהות השינוי")
+
+def _may_have_events(html: str) -> bool:
+    if "&#" in html:  # a character reference can spell a gate phrase; markup can't
+        html = html_unescape(html)
+    return any(g in html for g in _EVENT_GATES)
+
 def parse_hebrew_report(html: str, url: str) -> list:
     """
     Extract events from a single MAYA 'attachmentType=htm' report page.
@@ -148,9 +244,11 @@ def parse_hebrew_report(html: str, url: str) -> list:
       kind: 'sell' | 'ceased'
       company, paper_number, holder, change_shares, price_agorot, price_nis, amount_nis, txn_date, url, raw_title
     """
-    soup = BeautifulSoup(html, "lxml")
+    if not _may_have_events(html):
+        return []  # not a holdings/ceased page; skip building the tree
+
     # Flatten to text for robust regex
-    text = soup.get_text("\n", strip=True)
+    text = text_from_html(html)
 
     events = []
 
@@ -162,22 +260,21 @@ def parse_hebrew_report(html: str, url: str) -> list:
         company = short
     if not company:
         # crude fallback: first line ending with בע"מ / בע״מ or company name block
-        lines = text.splitlines()
-        for ln in lines[:20]:
+        for ln in _head_lines(text, 20):
             if "בע\"מ" in ln or "בע״מ" in ln:
                 company = ln.strip()
                 break
 
     # Paper number
     paper_number = None
-    m = re.search(r"מספר נייר(?:\s+ערך)?(?:\s+בבורסה)?\s*:\s*([0-9]+)", text)
+    m = PAPER_PAT.search(text)
     if m:
         paper_number = m.group(1)
 
     # Title
     raw_title = None
     # try to find a strong clue near the top
-    for ln in text.splitlines()[:40]:
+    for ln in _head_lines(text, 40):
         if "דוח מיידי" in ln or "שינוי החזקות" in ln or "חדל להיות בעל עניין" in ln:
             raw_title = ln.strip()
             break
@@ -292,42 +389,43 @@ def send_email(subject: str, body: str):
 def write_csv(path: str, rows: list, header: list):
     # Always write (even if empty) so artifacts show up
     with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=header)
-        w.writeheader()
-        for r in rows:
-            w.writerow({k: r.get(k) for k in header})
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows([r.get(k) for k in header] for r in rows)
 
 def main():
     start_ts = datetime.now(timezone.utc).isoformat()
     all_links = []
-    for base in TASE_RSS_URLS:
-        all_links.extend(discover_report_links(base))
+    with ThreadPoolExecutor(max_workers=WORKERS) as ex:
+        for found in ex.map(discover_report_links, TASE_RSS_URLS):
+            all_links.extend(found)
 
-    # De-dup
-    seen = set()
-    links = []
-    for u in all_links:
-        if u not in seen:
-            seen.add(u)
-            links.append(u)
+    links = list(dict.fromkeys(all_links))  # de-dup, keep order
 
     log(f"Scanning {len(links)} MAYA report page(s)")
 
-    all_events = []
-    for link in links:
+    def scan(link):
         try:
-            u = normalize_report_url(link)
-            html = fetch(u, is_html=True)
-            evs = parse_hebrew_report(html, u)
-            if evs:
-                all_events.extend(evs)
+            # discover_report_links already returns normalized URLs
+            html = fetch_report(link)
+            return parse_hebrew_report(html, link)
         except Exception as e:
             log(f"parse failed: {link} :: {e}")
             traceback.print_exc()
-
-    # Split by kind
-    sells   = [e for e in all_events if e["kind"] == "sell"]
-    ceaseds = [e for e in all_events if e["kind"] == "ceased"]
+            return []
+
+    # fetched concurrently; ex.map hands results back in link order. Events are split by
+    # kind and sells grouped by company as they arrive; the digest and alerts CSV both read by_co
+    sells, ceaseds, by_co = [], [], {}
+    with ThreadPoolExecutor(max_workers=WORKERS) as ex:
+        for evs in ex.map(scan, links):
+            for e in evs or ():
+                if e["kind"] == "sell":
+                    sells.append(e)
+                    by_co.setdefault(e.get("company") or "?", []).append(e)
+                elif e["kind"] == "ceased":
+                    ceaseds.append(e)
+    totals = {co: sum(r["amount_nis"] or 0 for r in rows) for co, rows in by_co.items()}
 
     # Build digest text
     lines = []
@@ -337,12 +435,8 @@ def main():
 
     if sells:
         lines.append("SELLS:")
-        # Group by company for readability
-        by_co = {}
-        for e in sells:
-            by_co.setdefault(e.get("company") or "?", []).append(e)
         for co, rows in by_co.items():
-            total = sum([r["amount_nis"] or 0 for r in rows])
+            total = totals[co]
             lines.append(f"{co} — {len(rows)} sale(s), total ₪{total:,.0f}")
             for r in rows:
                 holder = r.get("holder") or "לא צוין"
@@ -380,18 +474,12 @@ def main():
     # Persist CSVs (for artifacts)
     # alerts: one row per company for sells; plus each ceased row
     alerts_rows = []
-    by_co = {}
-    for e in sells:
-        co = e.get("company") or "?"
-        by_co.setdefault(co, {"company": co, "sell_rows": [], "total_nis": 0.0})
-        by_co[co]["sell_rows"].append(e)
-        by_co[co]["total_nis"] += (e["amount_nis"] or 0)
-    for co, agg in by_co.items():
+    for co, rows in by_co.items():
         alerts_rows.append({
             "company": co,
             "kind": "sell",
-            "items": len(agg["sell_rows"]),
-            "total_nis": round(agg["total_nis"], 2),
+            "items": len(rows),
+            "total_nis": round(totals[co], 2),
             "generated_at": start_ts
         })
     for e in ceaseds: